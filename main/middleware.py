@@ -0,0 +1,270 @@
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from main.routers import REPLICA_DB_ALIAS, replica_reads
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting the queries run and their duration.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.render_started = self.render_ended = None
+        self.serialize_duration = 0.0
+        self.serializing = False
+
+    @property
+    def render_duration(self):
+        if self.render_ended is None:
+            return 0.0
+        return self.render_ended - self.render_started
+
+
+# Timing of the sampled request being handled, for the steps timed outside of
+# the middleware
+current_timing = ContextVar("current_timing", default=None)
+
+
+@contextmanager
+def time_serialization():
+    """
+    Count the block in the serialization time of the sampled request being
+    handled, less the queries it runs.
+    """
+    timing = current_timing.get()
+    if timing is None or timing.serializing:
+        yield
+        return
+    timing.serializing = True
+    started, queries_duration = time.perf_counter(), timing.queries.duration
+    try:
+        yield
+    finally:
+        timing.serializing = False
+        timing.serialize_duration += time.perf_counter() - started - (timing.queries.duration - queries_duration)
+
+
+class RequestTimingMiddleware:
+    """
+    Measure the time spent by a sample of the requests in SQL queries, in
+    serialization, in response rendering and overall.
+
+    The serialization covers the `data` of the serializers (see
+    `time_serialization()`), the rendering the encoding of the response by
+    its renderer, and `app` the rest of the handling, e.g. the middlewares,
+    the authentication and the views' own code.
+
+    The timings are sent in a `Server-Timing` header, readable from the
+    browser's developer tools, and logged as a key=value line (and as the
+    `timing` attribute of the log record). A streaming response produces its
+    body, and runs its queries, once this middleware returned: it is timed
+    and logged once consumed, without header. The sample rate is the
+    `request_timing_sample_rate` of the environment file.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_sampled():
+            return self.get_response(request)
+
+        request.timing = RequestTiming()
+        started = time.perf_counter()
+        with self.record_queries(request.timing):
+            response = self.get_response(request)
+        return self.report(request, response, started)
+
+    async def __acall__(self, request):
+        if not self.is_sampled():
+            return await self.get_response(request)
+
+        request.timing = RequestTiming()
+        started = time.perf_counter()
+        with self.record_queries(request.timing):
+            response = await self.get_response(request)
+        return self.report(request, response, started)
+
+    def is_sampled(self):
+        return self.sample_rate and random.random() < self.sample_rate
+
+    @contextmanager
+    def record_queries(self, timing):
+        token = current_timing.set(timing)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing.queries))
+                yield
+        finally:
+            current_timing.reset(token)
+
+    def get_metrics(self, timing, total):
+        return {
+            "db": timing.queries.duration,
+            "serialize": timing.serialize_duration,
+            "render": timing.render_duration,
+            "app": total - timing.queries.duration - timing.serialize_duration - timing.render_duration,
+            "total": total,
+        }
+
+    def report(self, request, response, started):
+        if response.streaming:
+            stream = self.atimed_stream if response.is_async else self.timed_stream
+            response.streaming_content = stream(request, response, response.streaming_content, started)
+            return response
+
+        metrics = self.get_metrics(request.timing, time.perf_counter() - started)
+        response["Server-Timing"] = ", ".join(
+            f'{name};dur={duration * 1000:.2f}'
+            + (f';desc="{request.timing.queries.count} queries"' if name == "db" else "")
+            for name, duration in metrics.items()
+        )
+        self.log(request, response, metrics)
+        return response
+
+    def timed_stream(self, request, response, content, started):
+        with self.record_queries(request.timing):
+            yield from content
+        self.log(request, response, self.get_metrics(request.timing, time.perf_counter() - started))
+
+    async def atimed_stream(self, request, response, content, started):
+        with self.record_queries(request.timing):
+            async for chunk in content:
+                yield chunk
+        self.log(request, response, self.get_metrics(request.timing, time.perf_counter() - started))
+
+    def log(self, request, response, metrics):
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": request.timing.queries.count,
+            **{f"{name}_ms": round(duration * 1000, 2) for name, duration in metrics.items()},
+        }
+        logger.info(
+            "request " + " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra={"timing": fields},
+        )
+
+    def process_template_response(self, request, response):
+        # Template (and DRF) responses are rendered once every middleware
+        # processed them: time it from its callback.
+        timing = getattr(request, "timing", None)
+        if timing is not None:
+            response.add_post_render_callback(lambda response: setattr(timing, "render_ended", time.perf_counter()))
+            timing.render_started = time.perf_counter()
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Read the safe requests from the replica database, unless the client wrote
+    in the last `db_replica_sticky_seconds` of the environment file.
+
+    A write sends the client's reads to the primary until the replica caught
+    up, so that it reads its own writes: the writer is remembered by the user
+    of its bearer token, in the shared cache, and by a short-lived cookie for
+    the clients without one.
+    """
+
+    sync_capable = True
+    async_capable = True
+    cookie_name = "primary_reads"
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        if REPLICA_DB_ALIAS not in connections.settings:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = settings.DB_REPLICA_STICKY_SECONDS
+        self.authentication = JWTAuthentication()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user_key = self.get_user_key(request)
+        from_replica = self.reads_from_replica(request) and (user_key is None or cache.get(user_key) is None)
+        with replica_reads(from_replica):
+            response = self.get_response(request)
+        if self.sticks_to_primary(request) and user_key is not None:
+            cache.set(user_key, True, timeout=self.sticky_seconds)
+        return self.stick_to_primary(request, response)
+
+    async def __acall__(self, request):
+        user_key = self.get_user_key(request)
+        from_replica = self.reads_from_replica(request) and (user_key is None or await cache.aget(user_key) is None)
+        with replica_reads(from_replica):
+            response = await self.get_response(request)
+        if self.sticks_to_primary(request) and user_key is not None:
+            await cache.aset(user_key, True, timeout=self.sticky_seconds)
+        return self.stick_to_primary(request, response)
+
+    def get_user_key(self, request):
+        """
+        Return the cache key of the user of the request's bearer token, None
+        without a valid token.
+
+        The views authenticate the requests after the routing is decided: the
+        token is read here.
+        """
+        header = self.authentication.get_header(request)
+        raw_token = header and self.authentication.get_raw_token(header)
+        if not raw_token:
+            return None
+        try:
+            user_id = self.authentication.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, KeyError):
+            return None
+        return f"replica:primary-reads:{user_id}"
+
+    def reads_from_replica(self, request):
+        return request.method in self.safe_methods and self.cookie_name not in request.COOKIES
+
+    def sticks_to_primary(self, request):
+        return request.method not in self.safe_methods and self.sticky_seconds
+
+    def stick_to_primary(self, request, response):
+        if self.sticks_to_primary(request):
+            response.set_cookie(self.cookie_name, "1", max_age=self.sticky_seconds, httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = "replica"
+
+# Set for the safe requests by `main.middleware.ReplicaRoutingMiddleware`:
+# everything else (writes, management commands, shell) reads from the primary
+read_from_replica = ContextVar("read_from_replica", default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Send the reads run in the block to the replica database.
+    """
+    token = read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send the reads of the safe requests to the `replica` database and
+    everything else to the primary.
+
+    Once a safe request writes, or opens a transaction, its following reads
+    go to the primary so that it reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if read_from_replica.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        read_from_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is migrated by replication
+        return db == DEFAULT_DB_ALIAS
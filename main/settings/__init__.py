@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/2.0/ref/settings/
 from pathlib import Path
 
 from main.jsonenv import env
+from main.settings.cache import *
 from main.settings.core import *
 from main.settings.db import *
 from main.settings.logging import *
@@ -48,12 +49,15 @@ INSTALLED_APPS = [
     "users",
     # External apps
     "django_extensions",
+    "django_filters",
     'rest_framework',
     'rest_framework_simplejwt'
 ]
 
 
 MIDDLEWARE = [
+    "main.middleware.RequestTimingMiddleware",
+    "main.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -87,6 +91,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "main.wsgi.application"
+ASGI_APPLICATION = "main.asgi.application"
 
 
 # Password validation
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from main.jsonenv import env
+from main.settings.core import TEST
+
+FILE_BASED_CACHE_BACKEND = "django.core.cache.backends.filebased.FileBasedCache"
+
+# The versions of the sales and of the article codes, and the authenticated
+# users, are shared by the processes through the default cache: it must not
+# be local to a process (see `sales.checks`)
+CACHES = {
+    "default": {
+        "BACKEND": env.get("cache_backend", FILE_BASED_CACHE_BACKEND),
+        "LOCATION": env.get("cache_location", "cache"),
+    }
+}
+if TEST:
+    # Never the cache of the environment, which the tests clear (see
+    # `main.testing.TestRunner`)
+    CACHES["default"] = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+elif CACHES["default"]["BACKEND"] == FILE_BASED_CACHE_BACKEND:
+    # Relative to the project directory rather than to the working one
+    CACHES["default"]["LOCATION"] = str(Path(__file__).resolve().parent.parent.parent / CACHES["default"]["LOCATION"])
+
+# Lifetime of the cached sales aggregates, they are invalidated on write anyway
+SALES_CACHE_TIMEOUT = env.get("sales_cache_timeout", 3600)
+
+# Lifetime of the cached sales counts, served as approximate counts
+SALES_COUNT_CACHE_TIMEOUT = env.get("sales_count_cache_timeout", 60)
+
+# Lifetime of the article code maps of the processes, they are reloaded on
+# article write anyway
+ARTICLE_CODES_TIMEOUT = env.get("article_codes_timeout", 60)
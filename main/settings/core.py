@@ -4,3 +4,6 @@ from main.jsonenv import env
 
 DEBUG = env.get("debug")
 TEST = len(sys.argv) > 1 and sys.argv[1] == "test"
+
+# Clears the caches before every test
+TEST_RUNNER = "main.testing.TestRunner"
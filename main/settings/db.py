@@ -1,9 +1,90 @@
+import copy
+
 from main.jsonenv import env
 
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": env.get("db_name"),
-    }
+# Production profile of SQLite: readers do not wait for the writer (WAL),
+# writers wait for each other instead of failing with "database is locked",
+# and connections are kept across requests
+SQLITE_PRODUCTION = env.get("sqlite_production", False)
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    # Durable at checkpoints only, which WAL keeps consistent
+    "synchronous": "normal",
+    "busy_timeout": env.get("sqlite_busy_timeout", 5000),
+    "mmap_size": env.get("sqlite_mmap_size", 256 * 1024 * 1024),
+    # Negative sizes are in KiB
+    "cache_size": env.get("sqlite_cache_size", -64 * 1024),
 }
+
+if env.get("db_host"):
+    # PostgreSQL, whose writers do not serialize on a database lock
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": env.get("db_name"),
+            "USER": env.get("db_user"),
+            "PASSWORD": env.get("db_password"),
+            "HOST": env.get("db_host"),
+            "PORT": env.get("db_port"),
+            # Large iterator() reads (e.g. the sales export) stream from
+            # server-side cursors, which a transaction-mode PgBouncer does not
+            # support: disable them behind one
+            "DISABLE_SERVER_SIDE_CURSORS": env.get("db_disable_server_side_cursors", False),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if env.get("db_pool_max_size"):
+        # psycopg's pool, shared by the threads of a process; Django rejects
+        # persistent connections along with it
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": env.get("db_pool_min_size", 2),
+            "max_size": env.get("db_pool_max_size"),
+            "timeout": env.get("db_pool_timeout", 10),
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = env.get("db_conn_max_age", 600)
+    if env.get("db_replica_host"):
+        DATABASES["replica"] = {
+            **DATABASES["default"],
+            "HOST": env.get("db_replica_host"),
+            "PORT": env.get("db_replica_port") or env.get("db_port"),
+            "OPTIONS": copy.deepcopy(DATABASES["default"]["OPTIONS"]),
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": env.get("db_name"),
+        }
+    }
+    if SQLITE_PRODUCTION:
+        DATABASES["default"].update({
+            "CONN_MAX_AGE": env.get("db_conn_max_age", 600),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                # Run on every new connection
+                "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()),
+                # Take the write lock when the transaction starts: a deferred
+                # transaction upgrading to a write fails at once when another
+                # writer committed meanwhile, whatever the busy timeout
+                "transaction_mode": "IMMEDIATE",
+            },
+        })
+    if env.get("db_replica_name"):
+        # e.g. a file copy of the database, standing in for a replica locally
+        DATABASES["replica"] = {**copy.deepcopy(DATABASES["default"]), "NAME": env.get("db_replica_name")}
+
+if "replica" in DATABASES:
+    # Read by the safe requests only (see main.routers), and mirroring the
+    # primary in tests
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["main.routers.ReplicaRouter"]
+
+# Seconds during which a client reads from the primary after writing, longer
+# than the replication lag
+DB_REPLICA_STICKY_SECONDS = env.get("db_replica_sticky_seconds", 5)
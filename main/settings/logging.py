@@ -32,3 +32,6 @@ LOGGING = {
         },
     },
 }
+
+# Share of the requests whose SQL and rendering time is measured and logged
+REQUEST_TIMING_SAMPLE_RATE = env.get("request_timing_sample_rate", 0.0)
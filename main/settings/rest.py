@@ -1,9 +1,19 @@
+from importlib.util import find_spec
+
 from main.jsonenv import env
 
+RENDERER_CLASSES = [
+    "rest_framework.renderers.JSONRenderer",
+    "rest_framework.renderers.BrowsableAPIRenderer",
+]
+# orjson is optional: when installed, it renders the JSON responses
+if find_spec("orjson") is not None:
+    RENDERER_CLASSES.insert(0, "main.renderers.ORJSONRenderer")
+
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS":"rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 25,
-    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('users.authentication.CachedJWTAuthentication',),
     # "DEFAULT_AUTHENTICATION_CLASSES": (
     #     # 'rest_framework.authentication.SessionAuthentication',
     #     # "rest_framework.authentication.TokenAuthentication",
@@ -14,5 +24,6 @@ REST_FRAMEWORK = {
         "rest_framework.filters.OrderingFilter",
     ],
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
+    "DEFAULT_RENDERER_CLASSES": RENDERER_CLASSES,
     "TEST_REQUEST_DEFAULT_FORMAT": "json",
 }
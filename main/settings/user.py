@@ -1 +1,12 @@
+from main.jsonenv import env
+
 AUTH_USER_MODEL = "users.User"
+
+# Lifetime of the users cached for the JWT authentication, shared by the
+# processes and invalidated when a user is saved
+AUTH_USER_CACHE_TIMEOUT = env.get("auth_user_cache_timeout", 60)
+
+# Lifetime of the copies local to each process, which other processes cannot
+# invalidate: keep it short
+AUTH_USER_LOCAL_CACHE_TIMEOUT = env.get("auth_user_local_cache_timeout", 5)
+AUTH_USER_LOCAL_CACHE_SIZE = 1024
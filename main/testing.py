@@ -0,0 +1,28 @@
+import unittest
+
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+
+
+class CacheClearingTestResult:
+    """
+    Test result mixin clearing the caches before every test: the tests roll
+    their transactions back, so neither the versions bumped on commit nor the
+    reused ids would tell one test's cached values from another's.
+    """
+
+    def startTest(self, test):
+        from sales.cache import article_codes
+        from users.authentication import local_user_cache
+
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        article_codes.clear()
+        local_user_cache.clear()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+        return type(resultclass.__name__, (CacheClearingTestResult, resultclass), {})
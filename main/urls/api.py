@@ -1,11 +1,14 @@
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework import routers
-from sales.views import ArticleViewset, SaleViewset
+from sales.views import ArticleViewset, SaleAggregateViewset, SaleReportViewset, SaleTimeSeriesViewset, SaleViewset
 
 router = routers.DefaultRouter(trailing_slash=False)
 router.register('article', ArticleViewset, basename='article')
 router.register('sale', SaleViewset, basename='sale')
+router.register('sale-aggregate', SaleAggregateViewset, basename='sale-aggregate')
+router.register('sale-timeseries', SaleTimeSeriesViewset, basename='sale-timeseries')
+router.register('sale-report', SaleReportViewset, basename='sale-report')
 
 urlpatterns = [
     path(
@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from sales.models import Article
+
+
+def _new_version():
+    # Versions restart from the clock rather than from 1 when their key is
+    # evicted, so that an evicted counter never reuses the key of stale data.
+    return time.time_ns()
+
+
+class ArticleCache:
+    """
+    Cache of values computed per article, invalidated by a version counter.
+
+    The values are stored under a key embedding the current version of the
+    article: bumping the version on write makes every cached value of the
+    article unreachable at once, without having to know their keys.
+    """
+
+    def __init__(self, name, timeout=None):
+        self.name = name
+        self.timeout = timeout
+        self.stats = Counter()
+
+    @staticmethod
+    def get_version_key(article_id):
+        return f"sales:article:{article_id}:version"
+
+    @classmethod
+    def get_version(cls, article_id):
+        key = cls.get_version_key(article_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, _new_version(), timeout=None)
+            version = cache.get(key)
+        return version
+
+    @classmethod
+    async def aget_version(cls, article_id):
+        key = cls.get_version_key(article_id)
+        version = await cache.aget(key)
+        if version is None:
+            await cache.aadd(key, _new_version(), timeout=None)
+            version = await cache.aget(key)
+        return version
+
+    @classmethod
+    def bump_version(cls, article_id):
+        key = cls.get_version_key(article_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+    def get_key(self, article_id):
+        return f"sales:{self.name}:{article_id}:{self.get_version(article_id)}"
+
+    def get(self, article_id):
+        value = cache.get(self.get_key(article_id))
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def set(self, article_id, value):
+        cache.set(self.get_key(article_id), value, timeout=self.timeout or settings.SALES_CACHE_TIMEOUT)
+
+    async def aget_key(self, article_id):
+        return f"sales:{self.name}:{article_id}:{await self.aget_version(article_id)}"
+
+    async def aget(self, article_id):
+        value = await cache.aget(await self.aget_key(article_id))
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    async def aset(self, article_id, value):
+        await cache.aset(
+            await self.aget_key(article_id), value, timeout=self.timeout or settings.SALES_CACHE_TIMEOUT
+        )
+
+    def get_stats(self):
+        """
+        Return the hit and miss counters of this process.
+        """
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "hit_ratio": self.stats["hits"] / lookups if lookups else None,
+        }
+
+
+article_aggregates_cache = ArticleCache("aggregates")
+
+SALES_VERSION_KEY = "sales:version"
+
+
+def get_sales_version():
+    """
+    Return the version of the sales as a whole: the clock time of their last
+    change, in nanoseconds.
+    """
+    version = cache.get(SALES_VERSION_KEY)
+    if version is None:
+        cache.add(SALES_VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(SALES_VERSION_KEY)
+    return version
+
+
+async def aget_sales_version():
+    version = await cache.aget(SALES_VERSION_KEY)
+    if version is None:
+        await cache.aadd(SALES_VERSION_KEY, _new_version(), timeout=None)
+        version = await cache.aget(SALES_VERSION_KEY)
+    return version
+
+
+def bump_sales_version():
+    cache.set(SALES_VERSION_KEY, _new_version(), timeout=None)
+
+
+def invalidate_articles(article_ids):
+    """
+    Invalidate the cached values of the given articles, and the version of the
+    sales, once the current transaction commits, so that no reader caches the
+    data being replaced.
+    """
+    article_ids = list(article_ids)
+
+    def bump_versions():
+        for article_id in article_ids:
+            ArticleCache.bump_version(article_id)
+        bump_sales_version()
+
+    transaction.on_commit(bump_versions)
+
+
+class ArticleCodeMap:
+    """
+    Map of the article codes to their ids, local to the process.
+
+    It is loaded with one query on the first lookup, and reloaded once the
+    shared version of the articles changed, which any article save or deletion
+    bumps (see `invalidate_article_codes`). Lookups then run no query: one
+    cache read checks the version. The map is also reloaded after
+    `ARTICLE_CODES_TIMEOUT` seconds, should a change bypass the version.
+    """
+
+    version_key = "sales:article-codes:version"
+
+    def __init__(self):
+        self.ids = {}
+        self.version = None
+        self.expires = 0
+        self.lock = threading.Lock()
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, _new_version(), timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def bump_version(self):
+        cache.set(self.version_key, _new_version(), timeout=None)
+
+    def resolve_many(self, codes):
+        """
+        Return the ids of the given codes by code, leaving out the unknown ones.
+        """
+        version = self.get_version()
+        with self.lock:
+            if version != self.version or self.expires < time.monotonic():
+                # The version is read before the articles: a change committed
+                # meanwhile triggers another reload
+                self.ids = dict(Article.objects.values_list("code", "pk"))
+                self.version = version
+                self.expires = time.monotonic() + settings.ARTICLE_CODES_TIMEOUT
+            ids = self.ids
+        return {code: ids[code] for code in codes if code in ids}
+
+    def resolve(self, code):
+        return self.resolve_many([code]).get(code)
+
+    def clear(self):
+        with self.lock:
+            self.ids = {}
+            self.version = None
+            self.expires = 0
+
+
+article_codes = ArticleCodeMap()
+
+
+def invalidate_article_codes():
+    """
+    Reload the article code maps of every process once the current
+    transaction commits.
+    """
+    transaction.on_commit(article_codes.bump_version)
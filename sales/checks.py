@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warn when the default cache is local to the process: the writes of one
+    process would not invalidate what the others cached.
+    """
+    if settings.DEBUG or settings.TEST or settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            "The default cache is local to the process.",
+            hint=(
+                "The versions of the sales and of the article codes, and the authenticated users, are "
+                "shared through it: use a backend shared by the processes, such as the file-based, "
+                "Memcached or Redis ones."
+            ),
+            id="sales.W001",
+        )
+    ]
@@ -0,0 +1,70 @@
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class Echo:
+    """
+    File-like object returning what is written to it, to stream a csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVLines:
+    """
+    Encoder of representations as CSV lines, after a header line.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.writer = csv.writer(Echo())
+
+    def header(self):
+        return self.writer.writerow(self.fields)
+
+    def encode(self, representation):
+        return self.writer.writerow([representation[field] for field in self.fields])
+
+
+class NDJSONLines:
+    """
+    Encoder of representations as JSON lines.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.encoder = JSONEncoder()
+
+    def header(self):
+        return None
+
+    def encode(self, representation):
+        return self.encoder.encode({field: representation[field] for field in self.fields}) + "\n"
+
+
+def stream(lines, representations):
+    header = lines.header()
+    if header is not None:
+        yield header
+    for representation in representations:
+        yield lines.encode(representation)
+
+
+async def astream(lines, representations):
+    """
+    Asynchronous `stream()`, of an asynchronous iterable of representations.
+    """
+    header = lines.header()
+    if header is not None:
+        yield header
+    async for representation in representations:
+        yield lines.encode(representation)
+
+
+# Content type and line encoder of each export format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", CSVLines),
+    "ndjson": ("application/x-ndjson", NDJSONLines),
+}
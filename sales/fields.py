@@ -0,0 +1,93 @@
+from decimal import ROUND_HALF_UP, Context, Decimal, InvalidOperation
+
+from django import forms
+from django.core import validators
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import ExpressionWrapper
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+
+class MoneyField(models.Field):
+    """
+    Monetary amount stored as an integer number of minor units (e.g. cents).
+
+    Values are Decimals on the Python side, so models, forms and serializers
+    handle them as they would a DecimalField, while the database stores, sums
+    and multiplies plain integers: aggregates are exact and cheap. Arithmetic
+    combining money with other fields must be wrapped with `as_money()`.
+    """
+
+    empty_strings_allowed = False
+    default_error_messages = {
+        "invalid": _("“%(value)s” value must be a decimal number."),
+    }
+    description = _("Monetary amount")
+
+    def __init__(self, verbose_name=None, name=None, max_digits=None, decimal_places=2, **kwargs):
+        self.max_digits, self.decimal_places = max_digits, decimal_places
+        super().__init__(verbose_name, name, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits is not None:
+            kwargs["max_digits"] = self.max_digits
+        if self.decimal_places != 2:
+            kwargs["decimal_places"] = self.decimal_places
+        return name, path, args, kwargs
+
+    @cached_property
+    def validators(self):
+        return [*super().validators, validators.DecimalValidator(self.max_digits, self.decimal_places)]
+
+    @cached_property
+    def quantum(self):
+        return Decimal(1).scaleb(-self.decimal_places)
+
+    def get_internal_type(self):
+        return "BigIntegerField"
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        try:
+            if isinstance(value, float):
+                value = Context(prec=self.max_digits or 28).create_decimal_from_float(value)
+            else:
+                value = Decimal(value)
+            return value.quantize(self.quantum, rounding=ROUND_HALF_UP)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages["invalid"],
+                code="invalid",
+                params={"value": value},
+            )
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return int(self.to_python(value).scaleb(self.decimal_places))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(value).scaleb(-self.decimal_places).quantize(self.quantum)
+
+    def formfield(self, **kwargs):
+        return super().formfield(
+            **{
+                "form_class": forms.DecimalField,
+                "max_digits": self.max_digits,
+                "decimal_places": self.decimal_places,
+                **kwargs,
+            }
+        )
+
+
+def as_money(expression, decimal_places=2):
+    """
+    Declare an arithmetic expression over money amounts as a money amount.
+    """
+    return ExpressionWrapper(expression, output_field=MoneyField(decimal_places=decimal_places))
@@ -0,0 +1,43 @@
+from django_filters.rest_framework import CharFilter, DateFromToRangeFilter, FilterSet, NumberFilter, RangeFilter
+from rest_framework.filters import OrderingFilter
+
+from sales.models import Sale
+
+
+class SaleFilter(FilterSet):
+    """
+    Filters of the sales list, each backed by an index.
+    """
+
+    # ?date_after=&date_before=, sale_date_id_idx
+    date = DateFromToRangeFilter()
+    # sale_article_date_idx
+    article = NumberFilter(field_name='article_id')
+    # Unique index on the article code, then sale_article_date_idx
+    article_code = CharFilter(field_name='article__code')
+    # Index on the article category, then sale_article_date_idx: the sales of
+    # the articles of the category are sorted once found
+    category = NumberFilter(field_name='article__category_id')
+    # sale_author_date_idx
+    author = NumberFilter(field_name='author_id')
+    # ?quantity_min=&quantity_max=, sale_quantity_idx
+    quantity = RangeFilter()
+    # ?unit_selling_price_min=&unit_selling_price_max=, sale_unit_price_idx
+    unit_selling_price = RangeFilter()
+
+    class Meta:
+        model = Sale
+        fields = ['date', 'article', 'article_code', 'category', 'author', 'quantity', 'unit_selling_price']
+
+
+class SaleOrderingFilter(OrderingFilter):
+    """
+    Ordering filter breaking the ties on the id, in the direction of the first
+    term, so that the rows do not move between pages.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not any(term.lstrip('-') in ('id', 'pk') for term in ordering):
+            ordering = [*ordering, '-id' if ordering[0].startswith('-') else 'id']
+        return ordering
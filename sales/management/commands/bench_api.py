@@ -0,0 +1,187 @@
+import json
+import math
+import time
+from datetime import date
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from sales.models import Article, ArticleCategory
+from users.models import User
+
+PERCENTILES = (50, 95, 99)
+BUDGETS_PATH = Path(__file__).resolve().parents[2] / "bench_budgets.json"
+
+
+def percentile(values, percent):
+    """
+    Return the nearest-rank percentile of a list of values.
+    """
+    values = sorted(values)
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API endpoints against a seeded test database and report their latency percentiles, "
+        "query counts and scan steps as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Number of users to seed.")
+        parser.add_argument("--articles", type=int, default=100, help="Number of articles to seed.")
+        parser.add_argument("--sales", type=int, default=10000, help="Number of sales to seed.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the dataset.")
+        parser.add_argument("--iterations", type=int, default=50, help="Number of timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=5, help="Number of untimed requests per endpoint.")
+        parser.add_argument(
+            "--budgets",
+            default=BUDGETS_PATH,
+            help='JSON file of per-endpoint budgets, e.g. {"sale_list": {"queries": 3, "p95_ms": 50}}, '
+            "defaults to the stored query budgets.",
+        )
+        parser.add_argument(
+            "--fail-on-budget", action="store_true", help="Exit with an error when a budget is exceeded."
+        )
+        parser.add_argument("--output", help="File to write the report to, instead of the standard output.")
+
+    def handle(self, *args, **options):
+        budgets = {}
+        if options["budgets"]:
+            with open(options["budgets"]) as file:
+                budgets = json.load(file)
+
+        # Never benchmark (nor seed) the real database
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            call_command(
+                "populate_db",
+                users=options["users"],
+                articles=options["articles"],
+                sales=options["sales"],
+                seed=options["seed"],
+                stdout=StringIO(),
+            )
+            report = self.benchmark(options["iterations"], options["warmup"])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        violations = self.check_budgets(report, budgets)
+        output = json.dumps({"endpoints": report, "budget_violations": violations}, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if violations and options["fail_on_budget"]:
+            raise CommandError(f"{len(violations)} budget(s) exceeded:\n" + "\n".join(violations))
+
+    def get_endpoints(self, client, user):
+        """
+        Return the benchmarked requests by endpoint name, as functions of the
+        iteration number.
+        """
+        category = ArticleCategory.objects.first()
+        article = Article.objects.order_by("pk").first()
+
+        return {
+            "article_create": lambda index: client.post(reverse("article-list"), {
+                # Seeded codes start with letters: digits never collide
+                "code": f"{index:06d}",
+                "category": category.pk,
+                "name": "Benchmark",
+                "manufacturing_cost": "10.00",
+            }),
+            "sale_create": lambda index: client.post(reverse("sale-list"), {
+                "date": date(2021, 6, 1).isoformat(),
+                "author": user.pk,
+                "article": article.pk,
+                "quantity": 1,
+                "unit_selling_price": "12.00",
+            }),
+            "sale_list": lambda index: client.get(reverse("sale-list")),
+            "sale_list_article": lambda index: client.get(reverse("sale-list"), {"article_id": article.pk}),
+            "sale_aggregate": lambda index: client.get(reverse("sale-aggregate-list")),
+        }
+
+    def benchmark(self, iterations, warmup=0):
+        user = User.objects.first()
+        client = APIClient()
+        client.force_authenticate(user)
+        report = {}
+        index = 0
+
+        for name, request in self.get_endpoints(client, user).items():
+            latencies, queries = [], []
+            for iteration in range(warmup + iterations):
+                index += 1
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = request(index)
+                    elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    raise CommandError(f"{name} answered {response.status_code}: {response.content[:200]!r}")
+                if iteration >= warmup:
+                    latencies.append(elapsed * 1000)
+                    queries.append(len(context.captured_queries))
+
+            index += 1
+            report[name] = {
+                **{f"p{percent}_ms": round(percentile(latencies, percent), 3) for percent in PERCENTILES},
+                "queries": max(queries),
+                "scan_steps": self.count_scan_steps(request, index),
+            }
+        return report
+
+    def count_scan_steps(self, request, index, granularity=100):
+        """
+        Return the number of SQLite virtual machine steps run by a request, a
+        proxy of the rows it reads, or None on other databases.
+
+        It is measured on a separate request, so that it does not weigh on the
+        latencies.
+        """
+        if connection.vendor != "sqlite":
+            return None
+
+        steps = 0
+
+        def count():
+            nonlocal steps
+            steps += granularity
+            return 0
+
+        connection.ensure_connection()
+        connection.connection.set_progress_handler(count, granularity)
+        try:
+            request(index)
+        finally:
+            connection.connection.set_progress_handler(None, granularity)
+        return steps
+
+    @staticmethod
+    def check_budgets(report, budgets):
+        """
+        Return a description of each budget exceeded by the report.
+        """
+        violations = []
+        for name, limits in budgets.items():
+            if name not in report:
+                violations.append(f"{name}: unknown endpoint")
+                continue
+            for metric, limit in limits.items():
+                value = report[name].get(metric)
+                if value is not None and value > limit:
+                    violations.append(f"{name}: {metric} is {value}, over the budget of {limit}")
+        return violations
@@ -0,0 +1,75 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from sales.serializers import SaleRowSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the JSON renderers on realistic pages of the sales list, and report their timings as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=2000, help="Number of pages rendered by each renderer.")
+        parser.add_argument("--page-size", type=int, default=settings.REST_FRAMEWORK["PAGE_SIZE"])
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        renderers = {"json": JSONRenderer()}
+        try:
+            renderers["orjson"] = import_string("main.renderers.ORJSONRenderer")()
+        except ImportError:
+            raise CommandError("orjson is not installed.")
+
+        pages = self.build_pages(options["pages"], options["page_size"], random.Random(options["seed"]))
+
+        report = {}
+        for name, renderer in renderers.items():
+            started = time.perf_counter()
+            size = sum(len(renderer.render(page)) for page in pages)
+            elapsed = time.perf_counter() - started
+            report[name] = {
+                "total_ms": round(elapsed * 1000, 3),
+                "per_page_us": round(elapsed / len(pages) * 10**6, 3),
+                "bytes_per_page": size // len(pages),
+            }
+        report["speedup"] = round(report["json"]["total_ms"] / report["orjson"]["total_ms"], 2)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def build_pages(self, count, page_size, rng):
+        """
+        Return pages shaped like the sales list restricted to an article: rows
+        rendered by SaleRowSerializer and the article totals.
+        """
+        serializer = SaleRowSerializer(())
+        pages = []
+        for page in range(count):
+            rows = [
+                {
+                    "id": page * page_size + index,
+                    "date": date(2021, 1, 1) + timedelta(days=rng.randrange(365)),
+                    "author_id": rng.randrange(1, 100),
+                    "article_id": rng.randrange(1, 1000),
+                    "quantity": rng.randrange(1, 100),
+                    "unit_selling_price": Decimal(rng.randrange(100, 100000)).scaleb(-2),
+                    "article_category": "Category",
+                }
+                for index in range(page_size)
+            ]
+            pages.append({
+                "count": 10**6,
+                "count_is_approximate": False,
+                "next": page + 2,
+                "previous": page or None,
+                "total_of_total_selling_price": rng.random() * 10**6,
+                "profit": rng.random() * 10**5,
+                "last_selling_date": date(2021, 12, 31),
+                "results": [serializer.to_representation(row) for row in rows],
+            })
+        return pages
@@ -0,0 +1,185 @@
+import asyncio
+import io
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from itertools import cycle, islice
+from urllib.parse import urlencode
+
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from sales.management.commands.bench_api import PERCENTILES, percentile
+from sales.models import Article, Sale
+from users.models import User
+
+# A remote client, out of the INTERNAL_IPS the debug toolbar shows up for
+CLIENT_ADDRESS = "192.0.2.1"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI and ASGI applications serving concurrent sales reads against a seeded test database, "
+        "and report their requests per second and latency percentiles as JSON. The applications are called "
+        "in-process, the WSGI one from a pool of threads like a threaded server, the ASGI one from an event loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Number of users to seed.")
+        parser.add_argument("--articles", type=int, default=100, help="Number of articles to seed.")
+        parser.add_argument("--sales", type=int, default=10000, help="Number of sales to seed.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the dataset.")
+        parser.add_argument("--requests", type=int, default=500, help="Number of requests per deployment.")
+        parser.add_argument("--concurrency", type=int, default=20, help="Number of concurrent clients.")
+
+    def handle(self, *args, **options):
+        # Never load (nor seed) the real database
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        # Keep the per-request logs out of the measures
+        logging.disable(logging.INFO)
+        try:
+            call_command(
+                "populate_db",
+                users=options["users"],
+                articles=options["articles"],
+                sales=options["sales"],
+                seed=options["seed"],
+                stdout=StringIO(),
+            )
+            requests = list(islice(cycle(self.get_requests()), options["requests"]))
+            report = {
+                "wsgi": self.run_wsgi(requests, options["concurrency"]),
+                "asgi": asyncio.run(self.run_asgi(requests, options["concurrency"])),
+            }
+        finally:
+            logging.disable(logging.NOTSET)
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def get_requests(self):
+        """
+        Return the (path, query string, headers) of a mix of dashboard polls.
+        """
+        token = str(AccessToken.for_user(User.objects.first()))
+        headers = {"authorization": f"Bearer {token}", "host": "testserver"}
+        article = Article.objects.order_by("pk").first()
+        sale = Sale.objects.order_by("pk").first()
+        return [
+            (reverse("sale-list"), "", headers),
+            (reverse("sale-list"), urlencode({"article_id": article.pk}), headers),
+            (reverse("sale-detail", args=[sale.pk]), "", headers),
+            (reverse("sale-aggregate-list"), "", headers),
+        ]
+
+    @staticmethod
+    def summarize(latencies, statuses, elapsed):
+        return {
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            **{f"p{percent}_ms": round(percentile(latencies, percent) * 1000, 3) for percent in PERCENTILES},
+            "errors": sum(status >= 400 for status in statuses),
+        }
+
+    def run_wsgi(self, requests, concurrency):
+        application = get_wsgi_application()
+
+        def call(request):
+            path, query_string, headers = request
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": query_string,
+                "SERVER_NAME": "testserver",
+                "SERVER_PORT": "80",
+                "SERVER_PROTOCOL": "HTTP/1.1",
+                "REMOTE_ADDR": CLIENT_ADDRESS,
+                "wsgi.version": (1, 0),
+                "wsgi.url_scheme": "http",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.errors": sys.stderr,
+                "wsgi.multithread": True,
+                "wsgi.multiprocess": False,
+                "wsgi.run_once": False,
+                **{f"HTTP_{name.upper()}": value for name, value in headers.items()},
+            }
+            status = []
+            started = time.perf_counter()
+            response = application(environ, lambda status_line, headers: status.append(int(status_line[:3])))
+            try:
+                b"".join(response)
+            finally:
+                response.close()
+            return time.perf_counter() - started, status[0]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(call, requests))
+        elapsed = time.perf_counter() - started
+        latencies, statuses = zip(*results)
+        return self.summarize(latencies, statuses, elapsed)
+
+    async def run_asgi(self, requests, concurrency):
+        application = get_asgi_application()
+        pending = iter(requests)
+        latencies, statuses = [], []
+
+        async def call(request):
+            path, query_string, headers = request
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query_string.encode(),
+                "root_path": "",
+                "headers": [(name.encode(), value.encode()) for name, value in headers.items()],
+                "client": (CLIENT_ADDRESS, 0),
+                "server": ("testserver", 80),
+            }
+            disconnected = asyncio.Event()
+            body_sent = False
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                # The client stays connected until the response is complete
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            status = []
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            started = time.perf_counter()
+            try:
+                await application(scope, receive, send)
+            finally:
+                disconnected.set()
+            latencies.append(time.perf_counter() - started)
+            statuses.append(status[0])
+
+        async def client():
+            for request in pending:
+                await call(request)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return self.summarize(latencies, statuses, elapsed)
@@ -1,50 +1,160 @@
+import random
+import time
 from datetime import date
 from decimal import Decimal
-from random import choice
+from itertools import islice
+from multiprocessing import Pool
 
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from faker import Faker
 
 from sales.models import Article, ArticleCategory, Sale
+from sales.rollups import rebuild_rollups
 from users.models import User
 
 fake = Faker()
 
+START_DATE = date(2021, 1, 1).toordinal()
+END_DATE = date(2021, 12, 31).toordinal()
+
+# Set in each worker process by `init_worker()`, to avoid pickling them with
+# every chunk
+_user_ids = _articles = None
+
+
+def init_worker(user_ids, articles):
+    global _user_ids, _articles
+    _user_ids, _articles = user_ids, articles
+
+
+def generate_sales(task):
+    """
+    Generate a chunk of sales as (date ordinal, author id, article id,
+    quantity, unit selling price in cents) tuples.
+
+    Each chunk has its own random generator derived from the seed, so the data
+    only depends on the seed, whatever the number of workers.
+    """
+    seed, index, size = task
+    rng = random.Random(f"{seed}-{index}")
+    sales = []
+    for _ in range(size):
+        article_id, cost_cents = rng.choice(_articles)
+        sales.append((
+            rng.randint(START_DATE, END_DATE),
+            rng.choice(_user_ids),
+            article_id,
+            rng.randint(1, 99),
+            cost_cents * rng.randint(120, 150) // 100,
+        ))
+    return sales
+
 
 class Command(BaseCommand):
     help = "Populate the database with dummy data."
 
-    @transaction.atomic
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Number of users to create.")
+        parser.add_argument("--articles", type=int, default=100, help="Number of articles to create.")
+        parser.add_argument("--sales", type=int, default=1000, help="Number of sales to create.")
+        parser.add_argument("--seed", type=int, help="Seed of the random data, for reproducible datasets.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Number of sales per INSERT chunk.")
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of processes generating the sales, 1 to generate inline."
+        )
+
     def handle(self, *args, **options):
-        users = [User.objects.create_user(email=fake.ascii_email()) for _ in range(10)]
+        started = time.monotonic()
+        seed = options["seed"] if options["seed"] is not None else random.randrange(2**32)
+        Faker.seed(seed)
+        fake.unique.clear()
+
+        with transaction.atomic():
+            user_ids = self.create_users(options["users"], options["batch_size"])
+            articles = self.create_articles(options["articles"], options["batch_size"])
+
+        created = self.create_sales(
+            options["sales"], seed, user_ids, articles, options["batch_size"], options["workers"]
+        )
+
+        with transaction.atomic():
+            # bulk_create() bypasses the signals maintaining the rollups
+            rebuild_rollups(batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nCreated {len(user_ids)} users, {len(articles)} articles and {created} sales "
+            f"in {time.monotonic() - started:.1f}s (seed {seed})."
+        ))
+
+    def create_users(self, count, batch_size):
+        # Hashing a password per user would dominate the creation time
+        password = make_password(None)
+        users = User.objects.bulk_create(
+            [User(email=fake.unique.ascii_email().lower(), password=password) for _ in range(count)],
+            batch_size=batch_size,
+        )
+        return [user.pk for user in users]
+
+    def create_articles(self, count, batch_size):
         categories = ArticleCategory.objects.bulk_create(
             [ArticleCategory(display_name=fake.word()) for _ in range(10)]
         )
-        articles = Article.objects.bulk_create(
-            [
-                Article(
-                    code=fake.pystr(3, 3).upper() + str(fake.pyint(100, 999)),
-                    category=choice(categories),
-                    name=fake.word(),
-                    manufacturing_cost=fake.pydecimal(
-                        left_digits=3, right_digits=2, positive=True
-                    ),
-                )
-                for _ in range(100)
-            ]
+        codes = set(Article.objects.values_list("code", flat=True))
+        articles = []
+        while len(articles) < count:
+            code = fake.pystr(3, 3).upper() + str(fake.pyint(100, 999))
+            if code in codes:
+                continue
+            codes.add(code)
+            articles.append(Article(
+                code=code,
+                category=fake.random_element(categories),
+                name=fake.word(),
+                manufacturing_cost=fake.pydecimal(left_digits=3, right_digits=2, positive=True),
+            ))
+        articles = Article.objects.bulk_create(articles, batch_size=batch_size)
+        return [(article.pk, int(article.manufacturing_cost * 100)) for article in articles]
+
+    def create_sales(self, count, seed, user_ids, articles, batch_size, workers):
+        """
+        Insert the sales chunk by chunk, so that memory stays flat whatever
+        their number.
+        """
+        tasks = (
+            (seed, index, min(batch_size, count - offset))
+            for index, offset in enumerate(range(0, count, batch_size))
         )
-        sales = []
-        for _ in range(1000):
-            article = choice(articles)
-            sales.append(
+        created = 0
+
+        if workers > 1:
+            with Pool(workers, initializer=init_worker, initargs=(user_ids, articles)) as pool:
+                # Generate a few chunks ahead of the inserts, not the whole dataset
+                while window := list(islice(tasks, workers * 2)):
+                    for chunk in pool.map(generate_sales, window):
+                        created += self.insert_sales(chunk, batch_size)
+                        self.stdout.write(f"Inserted {created}/{count} sales.", ending="\r")
+        else:
+            init_worker(user_ids, articles)
+            for task in tasks:
+                created += self.insert_sales(generate_sales(task), batch_size)
+                self.stdout.write(f"Inserted {created}/{count} sales.", ending="\r")
+
+        return created
+
+    def insert_sales(self, chunk, batch_size):
+        sales = Sale.objects.bulk_create(
+            [
                 Sale(
-                    date=fake.date_between_dates(date(2021, 1, 1), date(2021, 12, 31)),
-                    author=choice(users),
-                    article=article,
-                    quantity=fake.pyint(1, 99),
-                    unit_selling_price=Decimal(fake.pyint(120, 150) / 100)
-                    * article.manufacturing_cost,
+                    date=date.fromordinal(day),
+                    author_id=author_id,
+                    article_id=article_id,
+                    quantity=quantity,
+                    unit_selling_price=Decimal(price_cents).scaleb(-2),
                 )
-            )
-        Sale.objects.bulk_create(sales)
+                for day, author_id, article_id, quantity, price_cents in chunk
+            ],
+            batch_size=batch_size,
+        )
+        return len(sales)
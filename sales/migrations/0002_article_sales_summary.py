@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Sum
+
+
+def build_summaries(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    ArticleSalesSummary = apps.get_model('sales', 'ArticleSalesSummary')
+    rows = Sale.objects.values('article_id').annotate(
+        revenue=Sum(F('quantity') * F('unit_selling_price')),
+        cost=Sum(F('quantity') * F('article__manufacturing_cost')),
+        total_quantity=Sum('quantity'),
+        count=Count('id'),
+        last_date=Max('date'),
+    ).order_by()
+    ArticleSalesSummary.objects.bulk_create(
+        [
+            ArticleSalesSummary(
+                article_id=row['article_id'],
+                total_revenue=row['revenue'],
+                total_cost=row['cost'],
+                quantity=row['total_quantity'],
+                sale_count=row['count'],
+                last_sale_date=row['last_date'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleSalesSummary',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_summary', serialize=False, to='sales.article', verbose_name='Article')),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Total revenue')),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Total cost')),
+                ('quantity', models.PositiveBigIntegerField(default=0, verbose_name='Quantity')),
+                ('sale_count', models.PositiveIntegerField(default=0, verbose_name='Sale count')),
+                ('last_sale_date', models.DateField(blank=True, null=True, verbose_name='Last sale date')),
+            ],
+            options={
+                'verbose_name': 'Article Sales Summary',
+                'verbose_name_plural': 'Article Sales Summaries',
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
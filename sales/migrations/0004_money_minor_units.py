@@ -0,0 +1,82 @@
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+import sales.fields
+
+# (model, field, field options) of the monetary amounts moving to minor units
+MONEY_FIELDS = [
+    ('article', 'manufacturing_cost', {'max_digits': 11, 'verbose_name': 'Manufacturing Cost'}),
+    ('sale', 'unit_selling_price', {'max_digits': 11, 'verbose_name': 'Unit selling price'}),
+    ('articlesalessummary', 'total_revenue', {'default': 0, 'verbose_name': 'Total revenue'}),
+    ('articlesalessummary', 'total_cost', {'default': 0, 'verbose_name': 'Total cost'}),
+]
+
+# Digits of the decimal columns they replace
+DECIMAL_MAX_DIGITS = {'article': 11, 'sale': 11, 'articlesalessummary': 15}
+
+
+def to_minor_units(apps, schema_editor):
+    for model_name, field_name, _ in MONEY_FIELDS:
+        model = apps.get_model('sales', model_name)
+        model.objects.update(
+            **{field_name: Cast(Round(F(f'{field_name}_decimal') * 100), models.BigIntegerField())}
+        )
+
+
+def to_decimal(apps, schema_editor):
+    for model_name, field_name, _ in MONEY_FIELDS:
+        model = apps.get_model('sales', model_name)
+        model.objects.update(
+            # Divided as floats: SQLite divides its (integer) decimals with an
+            # integer result
+            **{
+                f'{field_name}_decimal': Cast(
+                    Cast(F(field_name), models.FloatField()) / 100,
+                    models.DecimalField(max_digits=17, decimal_places=2),
+                )
+            }
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_sale_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.RenameField(model_name=model_name, old_name=field_name, new_name=f'{field_name}_decimal')
+            for model_name, field_name, _ in MONEY_FIELDS
+        ],
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name=field_name,
+                field=sales.fields.MoneyField(**{'default': 0, **options}),
+                preserve_default='default' in options,
+            )
+            for model_name, field_name, options in MONEY_FIELDS
+        ],
+        # Nullable, so that a reversal re-adds them empty before to_decimal()
+        # fills them
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name=f'{field_name}_decimal',
+                field=models.DecimalField(
+                    decimal_places=2,
+                    max_digits=DECIMAL_MAX_DIGITS[model_name],
+                    null=True,
+                    verbose_name=options['verbose_name'],
+                ),
+            )
+            for model_name, field_name, options in MONEY_FIELDS
+        ],
+        migrations.RunPython(to_minor_units, to_decimal),
+        *[
+            migrations.RemoveField(model_name=model_name, name=f'{field_name}_decimal')
+            for model_name, field_name, _ in MONEY_FIELDS
+        ],
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:36
+
+import django.db.models.deletion
+import sales.fields
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+from sales.fields import as_money
+
+
+def build_daily_sales(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    SalesDaily = apps.get_model('sales', 'SalesDaily')
+    rows = Sale.objects.values('article_id', 'date').annotate(
+        revenue=Sum(as_money(F('quantity') * F('unit_selling_price'))),
+        cost=Sum(as_money(F('quantity') * F('article__manufacturing_cost'))),
+        total_quantity=Sum('quantity'),
+        count=Count('id'),
+    ).order_by()
+    SalesDaily.objects.bulk_create(
+        [
+            SalesDaily(
+                article_id=row['article_id'],
+                date=row['date'],
+                total_revenue=row['revenue'],
+                total_cost=row['cost'],
+                quantity=row['total_quantity'],
+                sale_count=row['count'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('total_revenue', sales.fields.MoneyField(default=0, verbose_name='Total revenue')),
+                ('total_cost', sales.fields.MoneyField(default=0, verbose_name='Total cost')),
+                ('quantity', models.PositiveBigIntegerField(default=0, verbose_name='Quantity')),
+                ('sale_count', models.PositiveIntegerField(default=0, verbose_name='Sale count')),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='sales.article', verbose_name='Article')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+                'indexes': [models.Index(fields=['date'], name='sales_daily_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('article', 'date'), name='sales_daily_article_date_unique')],
+            },
+        ),
+        migrations.RunPython(build_daily_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:34
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_sale_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(models.F('article'), django.db.models.expressions.CombinedExpression(models.F('quantity'), '*', models.F('unit_selling_price')), name='sale_article_total_idx'),
+        ),
+    ]
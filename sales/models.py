@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+
+from sales.fields import MoneyField
 
 
 class ArticleCategory(models.Model):
@@ -37,9 +40,7 @@ class Article(models.Model):
         on_delete=models.PROTECT,
     )
     name = models.CharField("Name", max_length=255)
-    manufacturing_cost = models.DecimalField(
-        "Manufacturing Cost", max_digits=11, decimal_places=2
-    )
+    manufacturing_cost = MoneyField("Manufacturing Cost", max_digits=11)
 
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -53,6 +54,20 @@ class Sale(models.Model):
     class Meta:
         verbose_name = "Sale"
         verbose_name_plural = "Sales"
+        indexes = [
+            # Last sale of an article, sales of an article by date
+            models.Index(fields=["article", "date"], name="sale_article_date_idx"),
+            # Sales of an article by total selling price, the default order of
+            # the sales of an article
+            models.Index(F("article"), F("quantity") * F("unit_selling_price"), name="sale_article_total_idx"),
+            # Sales list, ordered by date with the id as tie-breaker
+            models.Index(fields=["date", "id"], name="sale_date_id_idx"),
+            # Sales of an author by date
+            models.Index(fields=["author", "date"], name="sale_author_date_idx"),
+            # Quantity and price ranges and orderings
+            models.Index(fields=["quantity"], name="sale_quantity_idx"),
+            models.Index(fields=["unit_selling_price"], name="sale_unit_price_idx"),
+        ]
 
     objects = models.Manager()
 
@@ -67,12 +82,87 @@ class Sale(models.Model):
         Article, verbose_name="Article", related_name="sales", on_delete=models.CASCADE
     )
     quantity = models.PositiveIntegerField("Quantity")
-    unit_selling_price = models.DecimalField(
-        "Unit selling price", max_digits=11, decimal_places=2
-    )
+    unit_selling_price = MoneyField("Unit selling price", max_digits=11)
 
     def __str__(self):
         return f"{self.date} - {self.quantity} {self.article.name}"
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep the persisted values so the rollups can apply the exact delta
+        # of a later update.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The rollups are maintained by signal receivers: wrap the whole save
+        # so that they share the transaction of the sale itself.
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def total_selling_price(self):
         return self.quantity * self.unit_selling_price
+
+
+class ArticleSalesSummary(models.Model):
+    """
+    Running totals of the sales of an article, maintained on every sale write.
+    """
+
+    class Meta:
+        verbose_name = "Article Sales Summary"
+        verbose_name_plural = "Article Sales Summaries"
+
+    objects = models.Manager()
+
+    article = models.OneToOneField(
+        Article,
+        verbose_name="Article",
+        related_name="sales_summary",
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    total_revenue = MoneyField("Total revenue", default=0)
+    total_cost = MoneyField("Total cost", default=0)
+    quantity = models.PositiveBigIntegerField("Quantity", default=0)
+    sale_count = models.PositiveIntegerField("Sale count", default=0)
+    last_sale_date = models.DateField("Last sale date", null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.article_id} - {self.sale_count} sales"
+
+    @property
+    def profit(self):
+        return self.total_revenue - self.total_cost
+
+
+class SalesDaily(models.Model):
+    """
+    Totals of the sales of an article on a day, maintained on every sale write.
+    """
+
+    class Meta:
+        verbose_name = "Daily Sales"
+        verbose_name_plural = "Daily Sales"
+        constraints = [
+            models.UniqueConstraint(fields=["article", "date"], name="sales_daily_article_date_unique"),
+        ]
+        indexes = [
+            # Date ranges over every article
+            models.Index(fields=["date"], name="sales_daily_date_idx"),
+        ]
+
+    objects = models.Manager()
+
+    article = models.ForeignKey(
+        Article, verbose_name="Article", related_name="daily_sales", on_delete=models.CASCADE
+    )
+    date = models.DateField("Date")
+    total_revenue = MoneyField("Total revenue", default=0)
+    total_cost = MoneyField("Total cost", default=0)
+    quantity = models.PositiveBigIntegerField("Quantity", default=0)
+    sale_count = models.PositiveIntegerField("Sale count", default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.article_id} - {self.sale_count} sales"
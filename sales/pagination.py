@@ -0,0 +1,224 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict, namedtuple
+from hashlib import md5
+from urllib import parse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+Cursor = namedtuple("Cursor", ["reverse", "value", "pk"])
+
+
+class KnownCountPaginator(Paginator):
+    """
+    Paginator using a count computed beforehand when one is given.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class SalePageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination of the sales, with page numbers as links.
+
+    The count avoids a COUNT(*) over the sales: it comes from the counters
+    maintained by the view when the filters allow it, from a short-lived cache
+    per filter combination otherwise, in which case it is flagged as
+    approximate. `?exact_count=1` always counts the rows.
+    """
+
+    django_paginator_class = KnownCountPaginator
+    exact_count_query_param = 'exact_count'
+    # Query parameters that do not change the number of results
+    count_neutral_params = ('page', 'ordering', 'format', 'exact_count')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        count = self.get_count(queryset, request, view)
+        paginator = self.django_paginator_class(queryset, page_size, count=count)
+        page_number = self.get_page_number(request, paginator)
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        return list(self.page)
+
+    def get_count(self, queryset, request, view=None):
+        """
+        Return the number of results when it can be known without a COUNT(*),
+        None otherwise.
+        """
+        self.count_is_approximate = False
+        if request.query_params.get(self.exact_count_query_param) in ('1', 'true'):
+            return None
+
+        filter_params = {
+            key: request.query_params.getlist(key)
+            for key in request.query_params
+            if key not in self.count_neutral_params
+        }
+        if view is not None and hasattr(view, 'get_maintained_count'):
+            count = view.get_maintained_count(filter_params)
+            if count is not None:
+                return count
+
+        key = 'sales:count:' + md5(
+            json.dumps(sorted(filter_params.items())).encode(), usedforsecurity=False
+        ).hexdigest()
+        count = cache.get(key)
+        if count is not None:
+            self.count_is_approximate = True
+            return count
+        count = queryset.count()
+        cache.set(key, count, timeout=settings.SALES_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_page_metadata(self):
+        return OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_approximate', self.count_is_approximate),
+            ('next', self.page.next_page_number() if self.page.has_next() else None),
+            ('previous', self.page.previous_page_number() if self.page.has_previous() else None),
+        ])
+
+
+class SaleKeysetPagination(BasePagination):
+    """
+    Keyset pagination of the sales on an (ordering key, id) tuple.
+
+    Pages are fetched with a range condition on an indexed key rather than an
+    OFFSET, and no COUNT(*) is run: every page costs the same, however deep.
+    The ordering key is the first term of the queryset ordering when it is a
+    plain model field, the sale date otherwise.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    ordering_fields = ('date', 'author', 'article', 'quantity', 'unit_selling_price', 'id')
+    default_ordering = '-date'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.key, descending = self.get_ordering(queryset)
+        self.cursor = self.decode_cursor(request, queryset.model._meta.get_field(self.key))
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        descending = descending != reverse
+        direction = '-' if descending else ''
+        queryset = queryset.order_by(f'{direction}{self.key}', f'{direction}pk')
+
+        if self.cursor is not None:
+            # `key <= value AND (key < value OR pk < cursor pk)`: the first
+            # term is a plain range on the index, so the database seeks to the
+            # cursor instead of walking the rows before it.
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.key}__{lookup}e': self.cursor.value}),
+                Q(**{f'{self.key}__{lookup}': self.cursor.value}) | Q(**{f'pk__{lookup}': self.cursor.pk}),
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_ordering(self, queryset):
+        """
+        Return the attribute to page on and whether it is descending.
+        """
+        ordering = next(iter(queryset.query.order_by), self.default_ordering)
+        if not isinstance(ordering, str) or ordering.lstrip('-') not in self.ordering_fields:
+            ordering = self.default_ordering
+        field_name = ordering.lstrip('-')
+        return queryset.model._meta.get_field(field_name).attname, ordering.startswith('-')
+
+    def decode_cursor(self, request, key_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            value = key_field.to_python(tokens['v'][0])
+            pk = int(tokens['i'][0])
+        except (DjangoValidationError, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(reverse=reverse, value=value, pk=pk)
+
+    def encode_cursor(self, cursor):
+        tokens = {'v': str(cursor.value), 'i': str(cursor.pk)}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position(self, row):
+        if isinstance(row, dict):
+            return row[self.key], row['id']
+        return getattr(row, self.key), row.pk
+
+    def get_first_link(self):
+        # An empty page after a cursor (its rows were deleted meanwhile):
+        # restart from the top.
+        return replace_query_param(self.base_url, self.cursor_query_param, '')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return self.get_first_link()
+        value, pk = self._get_position(self.page[-1])
+        return self.encode_cursor(Cursor(reverse=False, value=value, pk=pk))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.get_first_link()
+        value, pk = self._get_position(self.page[0])
+        return self.encode_cursor(Cursor(reverse=True, value=value, pk=pk))
+
+    def get_page_metadata(self):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([*self.get_page_metadata().items(), ('results', data)]))
@@ -18,4 +18,4 @@ class IsOwnerOrReadOnly(BasePermission):
             return True
 
         # Write permissions are only allowed to the author of the sale.
-        return obj.author == request.user
\ No newline at end of file
+        return obj.author_id == request.user.id
\ No newline at end of file
@@ -0,0 +1,144 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, DateField, F, FloatField, Max, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, TruncMonth, TruncYear
+
+from sales.fields import as_money
+
+# Columns selected and grouped by for each dimension, by output name: field
+# paths as strings, or expressions. The first column is the key of the
+# dimension, the others depend on it.
+DIMENSIONS = {
+    "article": {"article_id": "article_id", "article_code": F("article__code")},
+    "category": {"category_id": F("article__category_id"), "category_name": F("article__category__display_name")},
+    "author": {"author_id": "author_id"},
+    "day": {"day": F("date")},
+    "month": {"month": TruncMonth("date", output_field=DateField())},
+    "year": {"year": TruncYear("date", output_field=DateField())},
+}
+
+_revenue = Sum(as_money(F("quantity") * F("unit_selling_price")))
+_cost = Sum(as_money(F("quantity") * F("article__manufacturing_cost")))
+
+# Aggregates computed for each group, by output name
+MEASURES = {
+    "revenue": _revenue,
+    "cost": _cost,
+    # NULL without revenue; the amounts are in cents, which their ratio cancels
+    "margin_percentage": (Cast(_revenue, FloatField()) - Cast(_cost, FloatField()))
+    * 100
+    / NullIf(Cast(_revenue, FloatField()), Value(0.0)),
+    "total_quantity": Sum("quantity"),
+    "sale_count": Count("id"),
+    "last_date": Max("date"),
+}
+
+# Groups without a margin sort as a zero margin, as keyset conditions cannot
+# compare NULLs
+SORT_KEY = "sort_key"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class SaleReport:
+    """
+    Pivot of the sales: measures of the groups of sales sharing the values of
+    some dimensions, compiled to a single GROUP BY query.
+
+    Only the whitelisted expressions of `DIMENSIONS` and `MEASURES` reach the
+    SQL. The groups are sorted on a measure or a dimension, then on the keys of
+    the dimensions, and paged through with a keyset cursor on these values: the
+    top N groups come first, and every page costs one query.
+    """
+
+    def __init__(self, dimensions, measures, ordering=None):
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+        self.columns = {
+            name: column for dimension in self.dimensions for name, column in DIMENSIONS[dimension].items()
+        }
+
+        ordering = ordering or "-" + ("revenue" if "revenue" in self.measures else self.measures[0])
+        self.descending = ordering.startswith("-")
+        name = ordering.lstrip("-")
+        self.order_column = next(iter(DIMENSIONS[name])) if name in DIMENSIONS else name
+        # The dimension keys break the ties: they identify a group
+        self.tie_columns = [next(iter(DIMENSIONS[dimension])) for dimension in self.dimensions]
+        if self.order_column in self.tie_columns:
+            self.tie_columns.remove(self.order_column)
+        self.sort_column = SORT_KEY if self.order_column == "margin_percentage" else self.order_column
+
+    @property
+    def output_columns(self):
+        return [*self.columns, *self.measures]
+
+    def get_queryset(self, sales):
+        """
+        Return the groups of the given sales, sorted.
+        """
+        fields = [column for column in self.columns.values() if isinstance(column, str)]
+        expressions = {name: column for name, column in self.columns.items() if not isinstance(column, str)}
+        queryset = sales.values(*fields, **expressions).annotate(**{name: MEASURES[name] for name in self.measures})
+
+        if self.sort_column == SORT_KEY:
+            queryset = queryset.annotate(**{SORT_KEY: Coalesce(F(self.order_column), Value(0.0))})
+        direction = "-" if self.descending else ""
+        return queryset.order_by(f"{direction}{self.sort_column}", *self.tie_columns)
+
+    def get_sort_columns(self):
+        return [(self.sort_column, self.descending), *((column, False) for column in self.tie_columns)]
+
+    def get_page(self, sales, limit, cursor=None):
+        """
+        Return the `limit` groups following the cursor, and the cursor of the
+        next page, None on the last one.
+        """
+        queryset = self.get_queryset(sales)
+        sort_columns = self.get_sort_columns()
+
+        if cursor is not None:
+            values = self.decode_cursor(cursor, len(sort_columns))
+            # Lexicographic comparison of the sort columns with the cursor:
+            # the first greater one, the previous ones being equal
+            conditions, equal = [], Q()
+            for (column, descending), value in zip(sort_columns, values):
+                conditions.append(equal & Q(**{f"{column}__{'lt' if descending else 'gt'}": value}))
+                equal &= Q(**{column: value})
+            try:
+                # The values are prepared for their columns here
+                queryset = queryset.filter(reduce(or_, conditions))
+            except (TypeError, ValueError, ValidationError):
+                raise InvalidCursor(cursor)
+
+        rows = list(queryset[:limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor([rows[-1][column] for column, _ in sort_columns])
+        for row in rows:
+            row.pop(SORT_KEY, None)
+        return rows, next_cursor
+
+    @staticmethod
+    def encode_cursor(values):
+        return urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor, length):
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode("ascii")))
+        except (BinasciiError, UnicodeError, ValueError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != length:
+            raise InvalidCursor(cursor)
+        if not all(isinstance(value, (str, int, float)) for value in values):
+            raise InvalidCursor(cursor)
+        return values
@@ -0,0 +1,214 @@
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum, Value
+
+from sales.cache import invalidate_articles
+from sales.fields import MoneyField, as_money
+from sales.models import Article, ArticleSalesSummary, Sale, SalesDaily
+
+SaleState = namedtuple("SaleState", ["article_id", "date", "quantity", "unit_selling_price"])
+
+
+def sale_state(sale):
+    """
+    Return the part of a sale that the rollups depend on.
+    """
+    return SaleState(
+        *(Sale._meta.get_field(field).to_python(getattr(sale, field)) for field in SaleState._fields)
+    )
+
+
+def loaded_sale_state(sale):
+    """
+    Return the state of a sale as it is stored in the database, or None for a
+    sale that has not been saved yet.
+    """
+    if sale.pk is None or sale._state.adding:
+        return None
+    loaded = getattr(sale, "_loaded_values", None)
+    if loaded is None or not set(SaleState._fields) <= loaded.keys():
+        loaded = Sale.objects.filter(pk=sale.pk).values(*SaleState._fields).first()
+        if loaded is None:
+            return None
+    return SaleState(**{field: loaded[field] for field in SaleState._fields})
+
+
+def _accumulate(removed, added, key):
+    """
+    Sum the revenue, quantity and count deltas of sale states grouped by `key`.
+    """
+    deltas = defaultdict(lambda: {"revenue": Decimal(0), "quantity": 0, "count": 0})
+    for sign, states in ((-1, removed), (1, added)):
+        for state in states:
+            delta = deltas[key(state)]
+            delta["revenue"] += sign * state.quantity * state.unit_selling_price
+            delta["quantity"] += sign * state.quantity
+            delta["count"] += sign
+    return deltas
+
+
+def _money(value):
+    return Value(value, output_field=MoneyField())
+
+
+def _apply_delta(rollup, delta, cost):
+    rollup.total_revenue += delta["revenue"]
+    rollup.quantity += delta["quantity"]
+    rollup.total_cost = rollup.quantity * cost
+    rollup.sale_count += delta["count"]
+
+
+ROLLUP_FIELDS = ["total_revenue", "total_cost", "quantity", "sale_count"]
+
+
+def apply_sale_changes(removed=(), added=()):
+    """
+    Update the rollups of the articles concerned by the given sale states.
+
+    The rollups are read and locked with one query per table, their new totals
+    computed here, and written back with one upsert per table, whatever the
+    number of articles and days.
+
+    Must be called after writing the sales: the last sale date of an article
+    losing sales is read back from `Sale`.
+    """
+    deltas = _accumulate(removed, added, key=lambda state: state.article_id)
+    if not deltas:
+        return
+
+    last_dates = {}
+    for state in added:
+        if state.article_id not in last_dates or state.date > last_dates[state.article_id]:
+            last_dates[state.article_id] = state.date
+    recompute_last_date = {state.article_id for state in removed}
+
+    invalidate_articles(deltas)
+    # Joins the transaction of the sale writes, if any, without a savepoint
+    with transaction.atomic(savepoint=False):
+        costs = dict(Article.objects.filter(pk__in=deltas).values_list("pk", "manufacturing_cost"))
+        # Articles missing from `costs` are being deleted along with their sales
+        recomputed_dates = dict(
+            Sale.objects.filter(article_id__in=recompute_last_date & costs.keys())
+            .values("article_id")
+            .annotate(last_date=Max("date"))
+            .order_by()
+            .values_list("article_id", "last_date")
+        )
+        summaries = ArticleSalesSummary.objects.select_for_update().filter(article_id__in=costs).order_by("pk")
+        summaries = {summary.article_id: summary for summary in summaries}
+
+        changed = []
+        for article_id in sorted(costs):
+            summary = summaries.get(article_id)
+            if summary is None:
+                if article_id not in last_dates:
+                    continue
+                summary = ArticleSalesSummary(article_id=article_id, total_revenue=Decimal(0), total_cost=Decimal(0))
+            _apply_delta(summary, deltas[article_id], costs[article_id])
+            if article_id in recompute_last_date:
+                summary.last_sale_date = recomputed_dates.get(article_id)
+            elif summary.last_sale_date is None or last_dates[article_id] > summary.last_sale_date:
+                summary.last_sale_date = last_dates[article_id]
+            changed.append(summary)
+        ArticleSalesSummary.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["article"],
+            update_fields=[*ROLLUP_FIELDS, "last_sale_date"],
+        )
+
+        _apply_daily_changes(removed, added, costs)
+
+
+def _apply_daily_changes(removed, added, costs):
+    deltas = _accumulate(removed, added, key=lambda state: (state.article_id, state.date))
+    deltas = {key: delta for key, delta in deltas.items() if key[0] in costs}
+    if not deltas:
+        return
+
+    # The days of the articles rather than their pairs, which would take two
+    # parameters each
+    days = SalesDaily.objects.select_for_update().filter(
+        article_id__in={article_id for article_id, _ in deltas}, date__in={date for _, date in deltas}
+    )
+    days = {(day.article_id, day.date): day for day in days.order_by("pk")}
+    created = {(state.article_id, state.date) for state in added}
+
+    changed, emptied = [], []
+    for (article_id, date), delta in sorted(deltas.items()):
+        day = days.get((article_id, date))
+        if day is None:
+            if (article_id, date) not in created:
+                continue
+            day = SalesDaily(article_id=article_id, date=date, total_revenue=Decimal(0), total_cost=Decimal(0))
+        _apply_delta(day, delta, costs[article_id])
+        if day.sale_count:
+            changed.append(day)
+        elif day.pk is not None:
+            emptied.append(day.pk)
+    SalesDaily.objects.bulk_create(
+        changed, update_conflicts=True, unique_fields=["article", "date"], update_fields=ROLLUP_FIELDS
+    )
+    if emptied:
+        SalesDaily.objects.filter(pk__in=emptied).delete()
+
+
+def apply_article_cost(article):
+    """
+    Reprice the cost rollups of an article after its manufacturing cost changed.
+    """
+    total_cost = as_money(F("quantity") * _money(article.manufacturing_cost))
+    ArticleSalesSummary.objects.filter(article_id=article.pk).update(total_cost=total_cost)
+    SalesDaily.objects.filter(article_id=article.pk).update(total_cost=total_cost)
+    invalidate_articles([article.pk])
+
+
+def rebuild_rollups(batch_size=1000):
+    """
+    Recompute every rollup from the `Sale` table.
+    """
+    invalidate_articles(Article.objects.values_list("pk", flat=True))
+    ArticleSalesSummary.objects.all().delete()
+    SalesDaily.objects.all().delete()
+
+    totals = {
+        "revenue": Sum(as_money(F("quantity") * F("unit_selling_price"))),
+        "cost": Sum(as_money(F("quantity") * F("article__manufacturing_cost"))),
+        "total_quantity": Sum("quantity"),
+        "count": Count("id"),
+    }
+    rows = Sale.objects.values("article_id").annotate(**totals, last_date=Max("date")).order_by()
+    summaries = ArticleSalesSummary.objects.bulk_create(
+        [
+            ArticleSalesSummary(
+                article_id=row["article_id"],
+                total_revenue=row["revenue"],
+                total_cost=row["cost"],
+                quantity=row["total_quantity"],
+                sale_count=row["count"],
+                last_sale_date=row["last_date"],
+            )
+            for row in rows.iterator(chunk_size=batch_size)
+        ],
+        batch_size=batch_size,
+    )
+
+    rows = Sale.objects.values("article_id", "date").annotate(**totals).order_by()
+    days = (
+        SalesDaily(
+            article_id=row["article_id"],
+            date=row["date"],
+            total_revenue=row["revenue"],
+            total_cost=row["cost"],
+            quantity=row["total_quantity"],
+            sale_count=row["count"],
+        )
+        for row in rows.iterator(chunk_size=batch_size)
+    )
+    while batch := list(islice(days, batch_size)):
+        SalesDaily.objects.bulk_create(batch)
+
+    return len(summaries)
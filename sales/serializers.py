@@ -1,29 +1,325 @@
 
-from rest_framework.serializers import ModelSerializer, SerializerMethodField, PrimaryKeyRelatedField
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F
+from rest_framework.serializers import (
+    CharField, ChoiceField, DateField, DecimalField, IntegerField, ListField, ListSerializer, ModelSerializer,
+    PrimaryKeyRelatedField, Serializer, SerializerMethodField, ValidationError,
+)
+from rest_framework.settings import api_settings
+from main.middleware import time_serialization
+from sales.cache import article_codes
 from sales.models import Article, Sale
+from sales.reports import DIMENSIONS, MEASURES
 from users.models import User
  
-class ArticleSerializer(ModelSerializer):
+class PrefetchedPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """
+    Primary key related field resolving its instances from the serializer
+    context when they were fetched beforehand, e.g. for a batch of serializers.
+
+    The context maps the related model to a `{pk: instance}` dictionary, as
+    returned by `QuerySet.in_bulk()`.
+    """
+
+    def to_internal_value(self, data):
+        model = self.get_queryset().model
+        instances = self.context.get('related_instances', {}).get(model)
+        if instances is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = model._meta.pk.to_python(data)
+        except (DjangoValidationError, TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in instances:
+            self.fail('does_not_exist', pk_value=data)
+        return instances[pk]
+
+
+class TimedDataMixin:
+    """
+    Count the `data` of the serializer in the serialization time of the
+    sampled requests (see `main.middleware.RequestTimingMiddleware`).
+    """
+
+    @property
+    def data(self):
+        with time_serialization():
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, ListSerializer):
+    pass
+
+
+class ArticleSerializer(TimedDataMixin, ModelSerializer):
     """
     Serializer for the Article model
     """
  
+    manufacturing_cost = DecimalField(max_digits=11, decimal_places=2)
+
     class Meta:
         model = Article
         fields = ['id', 'code', 'category', 'name', 'manufacturing_cost']
+        list_serializer_class = TimedListSerializer
 
 
-class SaleSerializer(ModelSerializer):
+class SaleSerializer(TimedDataMixin, ModelSerializer):
     """
     Serializer for the Sale model
     """
 
-    author = PrimaryKeyRelatedField(queryset=User.objects.all()) # This line add author selection in SaleSerializer
+    author = PrefetchedPrimaryKeyRelatedField(queryset=User.objects.all()) # This line add author selection in SaleSerializer
+    article = PrefetchedPrimaryKeyRelatedField(queryset=Article.objects.select_related('category'))
+    # Alternative to `article`, resolved to its id without any query
+    article_code = CharField(max_length=6, write_only=True, required=False)
+    unit_selling_price = DecimalField(max_digits=11, decimal_places=2)
     article_category = SerializerMethodField()
 
     class Meta:
         model = Sale
-        fields = ['id', 'date', 'author', 'article', 'article_category', 'quantity', 'unit_selling_price', 'total_selling_price']
+        fields = [
+            'id', 'date', 'author', 'article', 'article_code', 'article_category', 'quantity', 'unit_selling_price',
+            'total_selling_price',
+        ]
+        list_serializer_class = TimedListSerializer
 
     def get_article_category(self, obj):
         return obj.article.category.display_name
+
+    def to_internal_value(self, data):
+        code = data.get('article_code') if hasattr(data, 'get') else None
+        if code is not None:
+            if data.get('article') is not None:
+                raise ValidationError({'article_code': ['Give either an article or its code, not both.']})
+            if not isinstance(code, str):
+                raise ValidationError({'article_code': ['Not a valid string.']})
+            # Batches resolve all their codes beforehand
+            article_ids = self.context.get('article_ids_by_code')
+            article_id = article_ids.get(code) if article_ids is not None else article_codes.resolve(code)
+            if article_id is None:
+                raise ValidationError({'article_code': [f'Invalid code "{code}" - object does not exist.']})
+            data = data.copy()
+            data['article'] = article_id
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        attrs.pop('article_code', None)
+        return attrs
+
+    @classmethod
+    def get_related_instances(cls, items, article_ids_by_code=None):
+        """
+        Fetch the authors and articles referenced by a batch of sale payloads,
+        with one query per related model.
+
+        The articles given by code are included by their ids, as returned by
+        `get_article_ids_by_code()`.
+        """
+        related_instances = {}
+        for field_name, model in (('author', User), ('article', Article)):
+            pks = set()
+            for item in items:
+                try:
+                    pks.add(model._meta.pk.to_python(item[field_name]))
+                except (DjangoValidationError, KeyError, TypeError, ValueError):
+                    continue
+            if model is Article and article_ids_by_code:
+                pks.update(article_ids_by_code.values())
+            related_instances[model] = model.objects.in_bulk(pks - {None})
+        return related_instances
+
+    @staticmethod
+    def get_article_ids_by_code(items):
+        """
+        Resolve the article codes of a batch of sale payloads to their ids.
+        """
+        return article_codes.resolve_many({
+            item['article_code'] for item in items if isinstance(item.get('article_code'), str)
+        })
+
+
+class SaleRowSerializer:
+    """
+    Read-only serializer of the sale rows selected by `SaleRowSerializer.values`
+
+    Renders the same representation as SaleSerializer, without building model
+    instances nor running the per-field machinery of DRF serializers.
+    """
+
+    fields = (
+        'id', 'date', 'author', 'article', 'article_category', 'quantity', 'unit_selling_price', 'total_selling_price',
+    )
+    unit_selling_price_field = DecimalField(max_digits=11, decimal_places=2)
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @staticmethod
+    def values(queryset):
+        return queryset.values(
+            'id', 'date', 'author_id', 'article_id', 'quantity', 'unit_selling_price',
+            article_category=F('article__category__display_name'),
+        )
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'date': row['date'].isoformat(),
+            'author': row['author_id'],
+            'article': row['article_id'],
+            'article_category': row['article_category'],
+            'quantity': row['quantity'],
+            'unit_selling_price': self.unit_selling_price_field.to_representation(row['unit_selling_price']),
+            'total_selling_price': row['quantity'] * row['unit_selling_price'],
+        }
+
+    def iter_representations(self):
+        return (self.to_representation(row) for row in self.rows)
+
+    async def aiter_representations(self):
+        async for row in self.rows:
+            yield self.to_representation(row)
+
+    @property
+    def data(self):
+        with time_serialization():
+            return list(self.iter_representations())
+
+
+class SaleAggregateSerializer(TimedDataMixin, Serializer):
+    """
+    Serializer for the sales aggregated by article
+    """
+
+    article = IntegerField(source='article_id')
+    article_code = CharField()
+    article_name = CharField()
+    article_category = CharField()
+    total_selling_price = DecimalField(max_digits=15, decimal_places=2)
+    margin_percentage = SerializerMethodField()
+    last_selling_date = DateField()
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+    def get_margin_percentage(self, row):
+        return margin_percentage(row['total_selling_price'], row['total_cost'])
+
+
+class SaleTimeSeriesQuerySerializer(Serializer):
+    """
+    Serializer for the query parameters of the sales time series
+    """
+
+    BUCKETS = ('day', 'week', 'month', 'year')
+
+    start = DateField()
+    end = DateField()
+    bucket = ChoiceField(choices=BUCKETS, default='day')
+    article = IntegerField(required=False)
+    category = IntegerField(required=False)
+
+    def validate(self, attrs):
+        if attrs['start'] > attrs['end']:
+            raise ValidationError({'end': 'The end of the range must follow its start.'})
+        return attrs
+
+
+class SaleTimeSeriesSerializer(TimedDataMixin, Serializer):
+    """
+    Serializer for a bucket of the sales time series
+    """
+
+    period = DateField()
+    revenue = DecimalField(max_digits=15, decimal_places=2)
+    cost = DecimalField(max_digits=15, decimal_places=2)
+    quantity = IntegerField()
+    sale_count = IntegerField()
+    margin_percentage = SerializerMethodField()
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+    def get_margin_percentage(self, row):
+        return margin_percentage(row['revenue'], row['cost'])
+
+
+class CommaSeparatedListField(ListField):
+    """
+    List field also reading comma separated values, e.g. `?measures=revenue,cost`
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [data]
+        if isinstance(data, list):
+            data = [value for item in data for value in (item.split(',') if isinstance(item, str) else [item])]
+        return super().to_internal_value(data)
+
+
+class SaleReportQuerySerializer(Serializer):
+    """
+    Serializer for the query parameters of the sales report
+    """
+
+    dimensions = CommaSeparatedListField(child=ChoiceField(choices=list(DIMENSIONS)), allow_empty=False)
+    measures = CommaSeparatedListField(
+        child=ChoiceField(choices=list(MEASURES)), allow_empty=False, default=['revenue', 'sale_count'],
+    )
+    # A dimension or a measure, descending when prefixed with '-'
+    ordering = CharField(required=False)
+    limit = IntegerField(min_value=1, max_value=1000, default=api_settings.PAGE_SIZE)
+    cursor = CharField(required=False)
+
+    def validate(self, attrs):
+        attrs['dimensions'] = list(dict.fromkeys(attrs['dimensions']))
+        attrs['measures'] = list(dict.fromkeys(attrs['measures']))
+        ordering = attrs.get('ordering')
+        if ordering is not None and ordering.lstrip('-') not in (*attrs['dimensions'], *attrs['measures']):
+            raise ValidationError({'ordering': 'The report can only be sorted on one of its dimensions or measures.'})
+        return attrs
+
+
+class SaleReportRowSerializer:
+    """
+    Read-only serializer of the groups of a `SaleReport`
+    """
+
+    money_field = DecimalField(max_digits=15, decimal_places=2)
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+
+    def to_representation(self, row):
+        representation = {}
+        for column in self.columns:
+            value = row[column]
+            if isinstance(value, Decimal):
+                value = self.money_field.to_representation(value)
+            elif isinstance(value, date):
+                value = value.isoformat()
+            elif isinstance(value, float):
+                value = round(value, 2)
+            representation[column] = value
+        return representation
+
+    @property
+    def data(self):
+        with time_serialization():
+            return [self.to_representation(row) for row in self.rows]
+
+
+def margin_percentage(revenue, cost):
+    """
+    Margin over the revenue, in percent rounded to 2 decimals.
+    """
+    if not revenue:
+        return None
+    return round(float((revenue - cost) * 100 / revenue), 2)
@@ -0,0 +1,49 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from sales.cache import invalidate_article_codes, invalidate_articles
+from sales.models import Article, ArticleCategory, Sale
+from sales.rollups import apply_article_cost, apply_sale_changes, loaded_sale_state, sale_state
+
+
+@receiver(pre_save, sender=Sale)
+def remember_previous_sale_state(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._previous_state = loaded_sale_state(instance)
+
+
+@receiver(post_save, sender=Sale)
+def update_rollups_on_sale_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_state", None)
+    current = sale_state(instance)
+    apply_sale_changes(removed=[previous] if previous else [], added=[current])
+    instance._loaded_values = current._asdict()
+
+
+@receiver(post_delete, sender=Sale)
+def update_rollups_on_sale_delete(sender, instance, **kwargs):
+    apply_sale_changes(removed=[sale_state(instance)])
+
+
+@receiver(post_save, sender=Article)
+def update_rollups_on_article_save(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    apply_article_cost(instance)
+
+
+@receiver(post_save, sender=ArticleCategory)
+def invalidate_articles_on_category_save(sender, instance, created, raw=False, **kwargs):
+    # The sales are listed with the name of their article's category
+    if raw or created:
+        return
+    invalidate_articles(instance.articles.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_article_codes_on_article_change(sender, instance, **kwargs):
+    invalidate_article_codes()
@@ -1,9 +1,32 @@
+import json
+from base64 import b64encode, urlsafe_b64encode
+import os
+import sqlite3
+import tempfile
+from decimal import Decimal
+from importlib.util import find_spec
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy, reverse
 from django.forms.models import model_to_dict
 from users.models import User
-from sales.models import ArticleCategory, Article, Sale
-from rest_framework.test import APITestCase
+from main.routers import REPLICA_DB_ALIAS, replica_reads
+from sales.models import ArticleCategory, Article, ArticleSalesSummary, Sale, SalesDaily
+from sales.cache import article_aggregates_cache
+from sales.checks import check_shared_cache
+from sales.management.commands.bench_api import BUDGETS_PATH, Command as BenchApiCommand
+from sales.management.commands.populate_db import generate_sales, init_worker
+from sales.serializers import SaleSerializer
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 
 
 class TestArticle(APITestCase):
@@ -184,4 +207,1810 @@ class TestSale(APITestCase):
         )
         self.client.force_authenticate(user=other_user)
         response = self.client.delete(reverse('sale-detail', args=[self.sale_to_delete.id]))
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_update_sale_not_author(self):
+        """
+        Test that a user who is not the author of a sale can't update it.
+        """
+        other_user = User.objects.create_user(email='otheruser@example.com', password='testpass')
+        self.client.force_authenticate(user=other_user)
+
+        response = self.client.patch(reverse('sale-detail', args=[self.sale_to_update.id]), {'quantity': 10})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.sale_to_update.refresh_from_db()
+        self.assertEqual(self.sale_to_update.quantity, 5)
+
+    def test_update_sale_without_changes(self):
+        """
+        Test that an update writing no field answers the sale to its author,
+        and 403 to the others whatever the payload.
+        """
+        url = reverse('sale-detail', args=[self.sale_to_update.id])
+
+        for data in ({}, {'id': 5}):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.patch(url, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['quantity'], 5)
+            self.assertFalse(any(query['sql'].startswith('UPDATE') for query in context.captured_queries))
+
+        self.client.force_authenticate(User.objects.create_user(email='otheruser@example.com', password='testpass'))
+        response = self.client.patch(url, {'quantity': 'many'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_write_missing_sale(self):
+        """
+        Test that writing a sale that does not exist answers 404.
+        """
+        url = reverse('sale-detail', args=[self.sale_to_delete.id + 100])
+
+        self.assertEqual(self.client.patch(url, {'quantity': 10}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_sale_queries(self):
+        """
+        Test that an update reads the sale once and writes it with one
+        conditional UPDATE.
+        """
+        url = reverse('sale-detail', args=[self.sale_to_update.id])
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(url, {'quantity': 10})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['article_category'], 'Category')
+        sale_queries = [
+            query['sql'] for query in context.captured_queries
+            # The reads of the row, not of the rollups' last sale date
+            if query['sql'].startswith(('SELECT "sales_sale"."id"', 'UPDATE "sales_sale"'))
+        ]
+        self.assertEqual(len(sale_queries), 2)
+        self.assertIn('"author_id" =', sale_queries[1])
+        self.assertEqual(ArticleSalesSummary.objects.get(article=self.article).quantity, 15)
+
+    def test_delete_sale_queries(self):
+        """
+        Test that a deletion reads the sale once and deletes the locked row
+        through the deletion collector, whose receivers maintain the rollups.
+        """
+        url = reverse('sale-detail', args=[self.sale_to_delete.id])
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(url)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        sale_queries = [
+            query['sql'] for query in context.captured_queries
+            # The reads of the row, not of the rollups' last sale date
+            if query['sql'].startswith(('SELECT "sales_sale"."id"', 'DELETE FROM "sales_sale"'))
+        ]
+        self.assertEqual(len(sale_queries), 2)
+        self.assertIn('"author_id" =', sale_queries[0])
+        self.assertTrue(sale_queries[1].startswith('DELETE FROM "sales_sale" WHERE'))
+        self.assertFalse(Sale.objects.filter(pk=self.sale_to_delete.id).exists())
+        self.assertEqual(ArticleSalesSummary.objects.get(article=self.article).quantity, 5)
+
+
+class TestArticleSalesSummary(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00
+        )
+
+        self.first_sale = Sale.objects.create(
+            date='2023-04-09',
+            author=self.user,
+            article=self.article,
+            quantity=5,
+            unit_selling_price=25.00
+        )
+        self.last_sale = Sale.objects.create(
+            date='2023-04-12',
+            author=self.user,
+            article=self.article,
+            quantity=2,
+            unit_selling_price=30.00
+        )
+
+    def get_summary(self):
+        return ArticleSalesSummary.objects.get(article=self.article)
+
+    def test_summary_on_create(self):
+        """
+        Test that creating sales accumulates the totals of the article.
+        """
+        summary = self.get_summary()
+        self.assertEqual(summary.total_revenue, Decimal('185.00'))
+        self.assertEqual(summary.total_cost, Decimal('70.00'))
+        self.assertEqual(summary.quantity, 7)
+        self.assertEqual(summary.sale_count, 2)
+        self.assertEqual(str(summary.last_sale_date), '2023-04-12')
+
+    def test_summary_on_update_and_delete(self):
+        """
+        Test that updating and deleting sales apply their exact delta.
+        """
+        sale = Sale.objects.get(pk=self.first_sale.pk)
+        sale.quantity = 1
+        sale.save()
+        self.last_sale.delete()
+
+        summary = self.get_summary()
+        self.assertEqual(summary.total_revenue, Decimal('25.00'))
+        self.assertEqual(summary.total_cost, Decimal('10.00'))
+        self.assertEqual(summary.sale_count, 1)
+        self.assertEqual(str(summary.last_sale_date), '2023-04-09')
+
+    def test_summary_on_manufacturing_cost_change(self):
+        """
+        Test that the cost totals follow the manufacturing cost of the article.
+        """
+        self.article.manufacturing_cost = Decimal('20.00')
+        self.article.save()
+
+        self.assertEqual(self.get_summary().total_cost, Decimal('140.00'))
+
+    def test_list_article_aggregates(self):
+        """
+        Test that the article totals are read from the summary.
+        """
+        response = self.client.get(reverse('sale-list'), {'article_id': self.article.id})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_of_total_selling_price'], 185.0)
+        self.assertEqual(response.data['profit'], 115.0)
+        self.assertEqual(str(response.data['last_selling_date']), '2023-04-12')
+
+    def test_rebuild_sales_rollups(self):
+        """
+        Test that the rollups can be rebuilt from scratch.
+        """
+        ArticleSalesSummary.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+        summary = self.get_summary()
+        self.assertEqual(summary.total_revenue, Decimal('185.00'))
+        self.assertEqual(summary.sale_count, 2)
+
+
+class TestSaleAggregate(APITestCase):
+
+    url = reverse_lazy('sale-aggregate-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        category = ArticleCategory.objects.create(display_name='Category')
+        self.cheap_article = Article.objects.create(
+            code='ABC123', category=category, name='Cheap', manufacturing_cost=10.00
+        )
+        self.expensive_article = Article.objects.create(
+            code='DEF456', category=category, name='Expensive', manufacturing_cost=50.00
+        )
+
+        for article, unit_selling_price, date in (
+            (self.cheap_article, 20.00, '2023-04-09'),
+            (self.cheap_article, 20.00, '2023-04-10'),
+            (self.expensive_article, 100.00, '2023-04-08'),
+        ):
+            Sale.objects.create(
+                date=date,
+                author=self.user,
+                article=article,
+                quantity=2,
+                unit_selling_price=unit_selling_price
+            )
+
+    def test_list_aggregate(self):
+        """
+        Test that the sales are aggregated by article, ordered by total descending.
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        expensive, cheap = response.data['results']
+        self.assertEqual(expensive['article_code'], 'DEF456')
+        self.assertEqual(expensive['total_selling_price'], '200.00')
+        self.assertEqual(expensive['margin_percentage'], 50.0)
+        self.assertEqual(cheap['article_category'], 'Category')
+        self.assertEqual(cheap['total_selling_price'], '80.00')
+        self.assertEqual(cheap['last_selling_date'], '2023-04-10')
+
+    def test_list_aggregate_unauthenticated(self):
+        """
+        Test that unauthenticated users can't access the aggregated sales.
+        """
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestSaleKeysetPagination(APITestCase):
+
+    url = reverse_lazy('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00
+        )
+        # Several sales share each date, so pages must break ties on the id
+        self.sales = [
+            Sale.objects.create(
+                date=f'2023-04-{1 + index % 5:02d}',
+                author=self.user,
+                article=article,
+                quantity=1 + index % 3,
+                unit_selling_price=25.00
+            )
+            for index in range(30)
+        ]
+
+    def walk(self, params):
+        pages = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append(response)
+            if response.data['next'] is None:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walks_every_sale_once(self):
+        """
+        Test that following the next cursors returns every sale once, in order.
+        """
+        pages = self.walk({'cursor': ''})
+
+        ids = [sale['id'] for page in pages for sale in page.data['results']]
+        expected = sorted(self.sales, key=lambda sale: (sale.date, sale.id), reverse=True)
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(ids, [sale.id for sale in expected])
+
+    def test_cursor_with_ordering(self):
+        """
+        Test that the cursor pages follow the requested ordering.
+        """
+        pages = self.walk({'cursor': '', 'ordering': 'quantity'})
+
+        keys = [(sale['quantity'], sale['id']) for page in pages for sale in page.data['results']]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(keys), 30)
+
+    def test_cursor_previous(self):
+        """
+        Test that the previous cursor returns the page before.
+        """
+        first_page = self.client.get(self.url, {'cursor': ''})
+        second_page = self.client.get(first_page.data['next'])
+        previous_page = self.client.get(second_page.data['previous'])
+
+        self.assertIsNone(first_page.data['previous'])
+        self.assertEqual(previous_page.data['results'], first_page.data['results'])
+        self.assertIsNone(previous_page.data['previous'])
+
+    def test_invalid_cursor(self):
+        """
+        Test that a malformed cursor is rejected.
+        """
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Well-formed, but with a value that is not a date
+        cursor = b64encode(b'v=garbage&i=1').decode('ascii')
+        response = self.client.get(self.url, {'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestSaleReadQueries(APITestCase):
+
+    url = reverse_lazy('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        for index in range(30):
+            article = Article.objects.create(
+                code=f'ABC{100 + index}',
+                category=ArticleCategory.objects.create(display_name=f'Category {index}'),
+                name='Test Article',
+                manufacturing_cost=10.00
+            )
+            Sale.objects.create(
+                date='2023-04-09',
+                author=self.user,
+                article=article,
+                quantity=3,
+                unit_selling_price=25.10
+            )
+
+    def test_list_query_count(self):
+        """
+        Test that a full page of sales costs the highest sale id (for the ETag),
+        a count and a single select.
+        """
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_retrieve_query_count(self):
+        """
+        Test that a sale is retrieved with its article and category in one query,
+        after its existence check (for the ETag).
+        """
+        sale = Sale.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('sale-detail', args=[sale.id]))
+
+        self.assertEqual(response.data['article_category'], sale.article.category.display_name)
+
+    def test_list_matches_sale_serializer(self):
+        """
+        Test that the list fast path renders the same data as SaleSerializer.
+        """
+        response = self.client.get(self.url)
+
+        sales = Sale.objects.select_related('article__category').order_by('-date', '-id')[:25]
+        self.assertEqual(
+            json.loads(response.content)['results'],
+            json.loads(JSONRenderer().render(SaleSerializer(sales, many=True).data)),
+        )
+
+
+    def test_ordering_tie_breaker(self):
+        """
+        Test that the requested orderings break their ties on the id, so that
+        the pages of tied sales neither overlap nor skip any.
+        """
+        for ordering, order_by in (
+            # The rows are selected as values: 1 is the id column
+            ('author', '"sales_sale"."author_id" ASC, 1 ASC'),
+            ('-quantity', '5 DESC, 1 DESC'),
+            ('date,-id', '2 ASC, 1 DESC'),
+        ):
+            with self.subTest(ordering=ordering):
+                with CaptureQueriesContext(connection) as context:
+                    self.client.get(self.url, {'ordering': ordering, 'page': 2})
+                select = next(query['sql'] for query in context.captured_queries if 'LIMIT' in query['sql'])
+                self.assertIn(f'ORDER BY {order_by} LIMIT', select)
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is specific to SQLite')
+class TestSaleQueryPlans(APITestCase):
+    """
+    Run the queries of the sales endpoints through EXPLAIN QUERY PLAN and check
+    that they are served by an index, without full scans nor sorts.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00
+        )
+        self.sales = [
+            Sale.objects.create(
+                date=f'2023-04-{1 + index % 28:02d}',
+                author=self.user,
+                article=self.article,
+                quantity=1,
+                unit_selling_price=25.00
+            )
+            for index in range(60)
+        ]
+
+    def assertIndexedQueries(self, queries, allow_sort=False):
+        plans = []
+        for query in queries:
+            sql = query['sql']
+            if 'sales_sale' not in sql or not sql.startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                details = [row[-1] for row in cursor.fetchall()]
+            plans.append(details)
+            for detail in details:
+                if not allow_sort:
+                    self.assertNotIn('TEMP B-TREE', detail, f'{sql}\n{details}')
+                if detail.startswith('SCAN'):
+                    self.assertIn('INDEX', detail, f'{sql}\n{details}')
+        self.assertTrue(plans)
+
+    def assertIndexedRequest(self, method, url, params=None, allow_sort=False):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, params)
+        self.assertLess(response.status_code, 300)
+        self.assertIndexedQueries(context.captured_queries, allow_sort=allow_sort)
+        return response
+
+    def test_list(self):
+        response = self.assertIndexedRequest('get', reverse('sale-list'))
+        self.assertIndexedRequest('get', reverse('sale-list'), {'page': 2})
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_list_ordering(self):
+        for ordering in ('date', '-date', 'author', '-author', 'article', 'quantity', '-unit_selling_price'):
+            with self.subTest(ordering=ordering):
+                self.assertIndexedRequest('get', reverse('sale-list'), {'ordering': ordering})
+
+    def test_list_cursor(self):
+        for ordering in ('-date', 'date', 'author'):
+            with self.subTest(ordering=ordering):
+                response = self.assertIndexedRequest('get', reverse('sale-list'), {'cursor': '', 'ordering': ordering})
+                self.assertIndexedRequest('get', response.data['next'])
+
+    def test_list_article(self):
+        # The default order of the sales of an article, by total selling price
+        self.assertIndexedRequest('get', reverse('sale-list'), {'article_id': self.article.id})
+        self.assertIndexedRequest('get', reverse('sale-list'), {'article_id': self.article.id, 'page': 2})
+
+    def test_list_article_ordered_by_date(self):
+        self.assertIndexedRequest('get', reverse('sale-list'), {'article_id': self.article.id, 'ordering': '-date'})
+
+    def test_retrieve(self):
+        self.assertIndexedRequest('get', reverse('sale-detail', args=[self.sales[0].id]))
+
+    def test_list_filters(self):
+        for params in (
+            {'date_after': '2023-04-10', 'date_before': '2023-04-12'},
+            {'article': self.article.id},
+            {'article_code': self.article.code},
+            {'author': self.user.id},
+            {'quantity_min': 2},
+            {'unit_selling_price_min': '30.00', 'unit_selling_price_max': '40.00'},
+        ):
+            with self.subTest(params=params):
+                self.assertIndexedRequest('get', reverse('sale-list'), params)
+
+        # The sales of a category span several articles: they are found through
+        # indexes but sorted once found.
+        self.assertIndexedRequest('get', reverse('sale-list'), {'category': self.article.category_id}, allow_sort=True)
+
+    def test_delete_last_sale_date(self):
+        """
+        The deletion reads the new last sale date of the article back.
+        """
+        latest = max(self.sales, key=lambda sale: (sale.date, sale.id))
+        self.assertIndexedRequest('delete', reverse('sale-detail', args=[latest.id]))
+
+
+class TestSaleBulk(APITestCase):
+
+    url = reverse_lazy('sale-bulk')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00
+        )
+
+    def get_sale_data(self, **kwargs):
+        return {
+            'date': '2023-04-09',
+            'author': self.user.id,
+            'article': self.article.id,
+            'quantity': 2,
+            'unit_selling_price': '25.00',
+            **kwargs,
+        }
+
+    def test_bulk_create(self):
+        """
+        Test that valid sales are created and invalid ones reported by index.
+        """
+        response = self.client.post(self.url, data=[
+            self.get_sale_data(),
+            self.get_sale_data(article=self.article.id + 1),
+            self.get_sale_data(quantity=3),
+            self.get_sale_data(author='not-an-id'),
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 2])
+        self.assertEqual([item['index'] for item in response.data['errors']], [1, 3])
+        self.assertIn('article', response.data['errors'][0]['errors'])
+        self.assertEqual(Sale.objects.count(), 2)
+
+        summary = ArticleSalesSummary.objects.get(article=self.article)
+        self.assertEqual(summary.sale_count, 2)
+        self.assertEqual(summary.total_revenue, Decimal('125.00'))
+
+    def test_bulk_create_query_count(self):
+        """
+        Test that the number of queries does not depend on the batch size.
+        """
+        # Loads the per-process state, e.g. the article codes
+        self.client.post(self.url, data=[self.get_sale_data()])
+
+        with CaptureQueriesContext(connection) as small_batch:
+            self.client.post(self.url, data=[self.get_sale_data() for _ in range(2)])
+        with CaptureQueriesContext(connection) as large_batch:
+            self.client.post(self.url, data=[self.get_sale_data() for _ in range(100)])
+
+        self.assertEqual(len(small_batch), len(large_batch))
+        self.assertEqual(Sale.objects.count(), 103)
+
+    def test_bulk_create_rollup_queries(self):
+        """
+        Test that the rollups of a batch are written with a number of queries
+        independent of its articles and days.
+        """
+        articles = [
+            Article.objects.create(
+                code=f'ART{index:03}', category=self.article.category, name=f'Article {index}', manufacturing_cost=5
+            )
+            for index in range(10)
+        ]
+        self.client.post(self.url, data=[self.get_sale_data()])
+
+        with CaptureQueriesContext(connection) as one_article:
+            self.client.post(self.url, data=[self.get_sale_data() for _ in range(10)])
+        with CaptureQueriesContext(connection) as many_articles:
+            self.client.post(self.url, data=[
+                self.get_sale_data(article=article.id, date=f'2023-04-{day + 1:02}')
+                for article in articles for day in range(10)
+            ])
+
+        self.assertEqual(len(many_articles), len(one_article))
+        summary = ArticleSalesSummary.objects.get(article=articles[0])
+        self.assertEqual((summary.quantity, summary.total_revenue, summary.total_cost), (20, 500, 100))
+        self.assertEqual(str(summary.last_sale_date), '2023-04-10')
+        self.assertEqual(SalesDaily.objects.filter(article__in=articles).count(), 100)
+        self.assertEqual(SalesDaily.objects.get(article=self.article).sale_count, 11)
+
+    def test_bulk_create_invalid_payload(self):
+        """
+        Test that the payload must be a list of at most bulk_max_size sales.
+        """
+        response = self.client.post(self.url, data=self.get_sale_data())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(self.url, data=[self.get_sale_data()] * 1001)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Sale.objects.count(), 0)
+
+
+class TestSaleExport(APITestCase):
+
+    url = reverse_lazy('sale-export')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        category = ArticleCategory.objects.create(display_name='Category')
+        self.article = Article.objects.create(
+            code='ABC123', category=category, name='Test Article', manufacturing_cost=10.00
+        )
+        other_article = Article.objects.create(
+            code='DEF456', category=category, name='Other Article', manufacturing_cost=10.00
+        )
+        for article in (self.article, self.article, other_article):
+            Sale.objects.create(
+                date='2023-04-09',
+                author=self.user,
+                article=article,
+                quantity=3,
+                unit_selling_price=25.10
+            )
+
+    def test_export_csv(self):
+        """
+        Test that the sales are streamed as CSV with the computed columns.
+        """
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,date,author,article,article_category,quantity,unit_selling_price,total_selling_price')
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith(',Category,3,25.10,75.30'))
+
+    def test_export_ndjson_filtered(self):
+        """
+        Test that the NDJSON export applies the list filters.
+        """
+        response = self.client.get(self.url, {'export_format': 'ndjson', 'article_id': self.article.id})
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['article'] for row in rows}, {self.article.id})
+        self.assertEqual(rows[0]['total_selling_price'], 75.3)
+
+    def test_export_streams_iterator(self):
+        """
+        Test that the export streams from a synchronous iterator under WSGI.
+        """
+        response = self.client.get(self.url)
+        self.assertFalse(response.is_async)
+
+    async def test_export_asgi(self):
+        """
+        Test that the export streams from an asynchronous iterator under ASGI,
+        which Django would otherwise read whole.
+        """
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await AsyncClient().get(self.url, {'export_format': 'ndjson'}, headers=headers)
+
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['article_category'], 'Category')
+
+    def test_export_unknown_format(self):
+        response = self.client.get(self.url, {'export_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestArticleAggregatesCache(APITestCase):
+
+    url = reverse_lazy('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00
+        )
+        self.create_sale()
+
+    def create_sale(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Sale.objects.create(
+                date='2023-04-09',
+                author=self.user,
+                article=self.article,
+                quantity=2,
+                unit_selling_price=25.00
+            )
+
+    def get_list(self):
+        return self.client.get(self.url, {'article_id': self.article.id})
+
+    def test_cache_hit(self):
+        """
+        Test that repeated reads run no aggregate query.
+        """
+        self.get_list()
+        hits = article_aggregates_cache.stats['hits']
+
+        # The count and the page only
+        with self.assertNumQueries(2):
+            response = self.get_list()
+
+        self.assertEqual(response.data['total_of_total_selling_price'], 50.0)
+        self.assertEqual(article_aggregates_cache.stats['hits'], hits + 1)
+
+    def test_invalidated_by_sale_write(self):
+        """
+        Test that writing a sale of the article invalidates its cached totals.
+        """
+        self.get_list()
+        sale = self.create_sale()
+        self.assertEqual(self.get_list().data['total_of_total_selling_price'], 100.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+        self.assertEqual(self.get_list().data['total_of_total_selling_price'], 50.0)
+
+    def test_invalidated_by_manufacturing_cost(self):
+        """
+        Test that changing the manufacturing cost of the article invalidates its profit.
+        """
+        self.assertEqual(self.get_list().data['profit'], 30.0)
+
+        self.article.manufacturing_cost = Decimal('20.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.save()
+        self.assertEqual(self.get_list().data['profit'], 10.0)
+
+    def test_cache_stats(self):
+        """
+        Test that the cache counters are only exposed to admin users.
+        """
+        url = reverse('sale-cache-stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'hits', 'misses', 'hit_ratio'})
+
+
+class TestSaleCount(APITestCase):
+
+    url = reverse_lazy('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00
+        )
+        for _ in range(3):
+            Sale.objects.create(
+                date='2023-04-09',
+                author=self.user,
+                article=self.article,
+                quantity=2,
+                unit_selling_price=25.00
+            )
+
+    def get_count_queries(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, params)
+        return response, [query['sql'] for query in context.captured_queries if 'COUNT(' in query['sql']]
+
+    def test_maintained_count(self):
+        """
+        Test that unfiltered and article counts are read from the summaries.
+        """
+        for params in ({}, {'ordering': 'date'}, {'article_id': self.article.id}):
+            with self.subTest(params=params):
+                response, count_queries = self.get_count_queries(params)
+                self.assertEqual(response.data['count'], 3)
+                self.assertFalse(response.data['count_is_approximate'])
+                self.assertEqual(count_queries, [])
+
+    def test_exact_count(self):
+        """
+        Test that exact_count always counts the rows.
+        """
+        response, count_queries = self.get_count_queries({'exact_count': 1})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(count_queries), 1)
+
+    def test_unparsed_article_count(self):
+        """
+        Test that article values the filters accept without an integer are
+        counted from the rows.
+        """
+        for value in ('', '1.5'):
+            with self.subTest(article=value):
+                response = self.client.get(self.url, {'article': value})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data['count'], len(response.data['results']))
+
+
+class TestMoneyField(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=Decimal('0.07')
+        )
+
+    def test_stored_as_minor_units(self):
+        """
+        Test that amounts are stored as integer cents and read back as Decimals.
+        """
+        sale = Sale.objects.create(
+            date='2023-04-09', author=self.user, article=self.article, quantity=1, unit_selling_price='19.99'
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT unit_selling_price FROM sales_sale WHERE id = %s', [sale.id])
+            self.assertEqual(cursor.fetchone()[0], 1999)
+        self.assertEqual(Sale.objects.get(pk=sale.pk).unit_selling_price, Decimal('19.99'))
+        self.assertEqual(Sale.objects.filter(unit_selling_price__gte='19.99').count(), 1)
+
+    def test_exact_aggregation(self):
+        """
+        Test that the aggregates sum amounts without any rounding error.
+        """
+        for _ in range(10):
+            self.client.post(reverse('sale-list'), data={
+                'date': '2023-04-09',
+                'author': self.user.id,
+                'article': self.article.id,
+                'quantity': 3,
+                'unit_selling_price': '0.10',
+            })
+
+        response = self.client.get(reverse('sale-aggregate-list'))
+        self.assertEqual(response.data['results'][0]['total_selling_price'], '3.00')
+        self.assertEqual(response.data['results'][0]['margin_percentage'], 30.0)
+        summary = ArticleSalesSummary.objects.get(article=self.article)
+        self.assertEqual(summary.total_revenue, Decimal('3.00'))
+        self.assertEqual(summary.total_cost, Decimal('2.10'))
+
+
+class TestSaleTimeSeries(APITestCase):
+
+    url = reverse_lazy('sale-timeseries-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.category = ArticleCategory.objects.create(display_name='Category')
+        self.article = Article.objects.create(
+            code='ABC123', category=self.category, name='Test Article', manufacturing_cost=10.00
+        )
+        other_article = Article.objects.create(
+            code='DEF456',
+            category=ArticleCategory.objects.create(display_name='Other'),
+            name='Other Article',
+            manufacturing_cost=10.00
+        )
+        self.sales = [
+            Sale.objects.create(
+                date=date, author=self.user, article=article, quantity=2, unit_selling_price=20.00
+            )
+            for date, article in (
+                ('2023-01-10', self.article),
+                ('2023-01-10', self.article),
+                ('2023-01-20', other_article),
+                ('2023-02-05', self.article),
+            )
+        ]
+
+    def test_daily_rollups(self):
+        """
+        Test that the daily rollups follow the sales writes.
+        """
+        day = SalesDaily.objects.get(article=self.article, date='2023-01-10')
+        self.assertEqual(day.sale_count, 2)
+        self.assertEqual(day.total_revenue, Decimal('80.00'))
+        self.assertEqual(day.total_cost, Decimal('40.00'))
+
+        self.sales[0].delete()
+        self.sales[1].delete()
+        self.assertFalse(SalesDaily.objects.filter(article=self.article, date='2023-01-10').exists())
+
+        ArticleSalesSummary.objects.all().delete()
+        SalesDaily.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(SalesDaily.objects.count(), 2)
+
+    def test_monthly_buckets(self):
+        """
+        Test that the totals are bucketed by month.
+        """
+        response = self.client.get(self.url, {'start': '2023-01-01', 'end': '2023-12-31', 'bucket': 'month'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['period'], row['revenue'], row['sale_count']) for row in response.data],
+            [('2023-01-01', '120.00', 3), ('2023-02-01', '40.00', 1)],
+        )
+        self.assertEqual(response.data[0]['margin_percentage'], 50.0)
+
+    def test_filters(self):
+        """
+        Test that the time series can be restricted to an article or a category.
+        """
+        for params in ({'article': self.article.id}, {'category': self.category.id}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, {'start': '2023-01-01', 'end': '2023-01-31', **params})
+                self.assertEqual(
+                    [(row['period'], row['quantity']) for row in response.data],
+                    [('2023-01-10', 4)],
+                )
+
+    def test_invalid_range(self):
+        response = self.client.get(self.url, {'start': '2023-02-01', 'end': '2023-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestSaleFilter(APITestCase):
+
+    url = reverse_lazy('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='testuser@example.com',
+            password='testpass'
+        )
+        self.other_user = User.objects.create_user(
+            email='otheruser@example.com',
+            password='testpass'
+        )
+        self.client.force_authenticate(user=self.user)
+
+        self.category = ArticleCategory.objects.create(display_name='Category')
+        self.article = Article.objects.create(
+            code='ABC123', category=self.category, name='Test Article', manufacturing_cost=10.00
+        )
+        self.other_article = Article.objects.create(
+            code='DEF456',
+            category=ArticleCategory.objects.create(display_name='Other'),
+            name='Other Article',
+            manufacturing_cost=10.00
+        )
+        self.sales = {
+            name: Sale.objects.create(
+                date=date, author=author, article=article, quantity=quantity, unit_selling_price=unit_selling_price
+            )
+            for name, date, author, article, quantity, unit_selling_price in (
+                ('early', '2023-01-10', self.user, self.article, 1, 20.00),
+                ('late', '2023-03-10', self.user, self.article, 5, 30.00),
+                ('other', '2023-02-10', self.other_user, self.other_article, 10, 40.00),
+            )
+        }
+
+    def assertFiltered(self, params, names):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(sale['id'] for sale in response.data['results']),
+            sorted(self.sales[name].id for name in names),
+        )
+        return response
+
+    def test_filters(self):
+        """
+        Test each filter of the sales list.
+        """
+        for params, names in (
+            ({'date_after': '2023-02-01'}, ['late', 'other']),
+            ({'date_before': '2023-02-10'}, ['early', 'other']),
+            ({'article': self.article.id}, ['early', 'late']),
+            ({'article_code': 'DEF456'}, ['other']),
+            ({'category': self.category.id}, ['early', 'late']),
+            ({'author': self.other_user.id}, ['other']),
+            ({'quantity_min': 2, 'quantity_max': 5}, ['late']),
+            ({'unit_selling_price_max': '30.00'}, ['early', 'late']),
+        ):
+            with self.subTest(params=params):
+                self.assertFiltered(params, names)
+
+    def test_unindexed_ordering_ignored(self):
+        """
+        Test that orderings outside of ordering_fields are ignored.
+        """
+        response = self.client.get(self.url, {'ordering': 'article__name'})
+        self.assertEqual(
+            [sale['id'] for sale in response.data['results']],
+            [self.sales[name].id for name in ('late', 'other', 'early')],
+        )
+
+    def test_cached_count(self):
+        """
+        Test that the counts of other filter combinations are cached and flagged as approximate.
+        """
+        response = self.assertFiltered({'author': self.user.id}, ['early', 'late'])
+        self.assertFalse(response.data['count_is_approximate'])
+
+        Sale.objects.create(
+            date='2023-04-10', author=self.user, article=self.article, quantity=1, unit_selling_price=20.00
+        )
+        response = self.client.get(self.url, {'author': self.user.id})
+        self.assertEqual(response.data['count'], 2)
+        self.assertTrue(response.data['count_is_approximate'])
+
+        response = self.client.get(self.url, {'author': self.user.id, 'exact_count': 1})
+        self.assertEqual(response.data['count'], 3)
+        self.assertFalse(response.data['count_is_approximate'])
+
+
+class TestPopulateDb(APITestCase):
+    def test_populate_db(self):
+        """
+        Test that the generated sales are inserted chunk by chunk, with their
+        rollups.
+        """
+        call_command(
+            'populate_db', users=3, articles=5, sales=25, seed=1, batch_size=10, stdout=StringIO()
+        )
+
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Article.objects.count(), 5)
+        self.assertEqual(Sale.objects.count(), 25)
+        self.assertEqual(sum(ArticleSalesSummary.objects.values_list('sale_count', flat=True)), 25)
+        self.assertFalse(User.objects.first().has_usable_password())
+
+    def test_populate_db_seed(self):
+        """
+        Test that the sales only depend on the seed, not on the chunks'
+        generation order.
+        """
+        init_worker([1, 2], [(1, 1000), (2, 2500)])
+        chunks = [generate_sales((1, index, 10)) for index in range(3)]
+
+        self.assertEqual(generate_sales((1, 2, 10)), chunks[2])
+        self.assertNotEqual(generate_sales((2, 2, 10)), chunks[2])
+
+
+class TestBenchApi(APITestCase):
+    def setUp(self):
+        call_command('populate_db', users=2, articles=3, sales=20, seed=1, stdout=StringIO())
+
+    def test_benchmark(self):
+        """
+        Test that every endpoint is benchmarked within its stored query budget.
+        """
+        command = BenchApiCommand()
+        report = command.benchmark(iterations=2, warmup=1)
+
+        with open(BUDGETS_PATH) as file:
+            budgets = json.load(file)
+        self.assertEqual(set(report), set(budgets))
+        self.assertEqual(command.check_budgets(report, budgets), [])
+        self.assertGreater(report['sale_list']['p50_ms'], 0)
+
+    def test_budget_exceeded(self):
+        """
+        Test that the metrics over their budget are reported.
+        """
+        report = {'sale_list': {'queries': 3, 'p95_ms': 10.0}}
+
+        violations = BenchApiCommand.check_budgets(report, {'sale_list': {'queries': 2, 'p95_ms': 20}})
+
+        self.assertEqual(violations, ['sale_list: queries is 3, over the budget of 2'])
+
+
+class TestRequestTiming(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+    def test_timing(self):
+        """
+        Test that a sampled request reports its SQL, serialization and
+        rendering time.
+        """
+        article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00,
+        )
+        for _ in range(20):
+            Sale.objects.create(date='2023-04-09', author=self.user, article=article, quantity=1, unit_selling_price=25)
+
+        with self.assertLogs('main.middleware', level='INFO') as logs:
+            response = self.client.get(reverse('sale-list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        server_timing = response['Server-Timing']
+        for metric in ('db;dur=', 'serialize;dur=', 'render;dur=', 'app;dur=', 'total;dur='):
+            self.assertIn(metric, server_timing)
+        timing = logs.records[0].timing
+        self.assertEqual(timing['path'], reverse('sale-list'))
+        self.assertGreater(timing['queries'], 0)
+        self.assertGreater(timing['serialize_ms'], 0)
+        self.assertGreater(timing['render_ms'], 0)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+    def test_streaming_timing(self):
+        """
+        Test that a streaming response is timed once its body is consumed,
+        with the queries reading it.
+        """
+        with self.assertLogs('main.middleware', level='INFO') as logs:
+            response = self.client.get(reverse('sale-export'))
+            self.assertEqual(logs.records, [])
+            b''.join(response.streaming_content)
+
+        self.assertNotIn('Server-Timing', response)
+        timing = logs.records[0].timing
+        self.assertEqual(timing['path'], reverse('sale-export'))
+        self.assertGreater(timing['queries'], 0)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1.0)
+    async def test_streaming_timing_asgi(self):
+        """
+        Test that an asynchronous streaming response is timed once consumed.
+        """
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        with self.assertLogs('main.middleware', level='INFO') as logs:
+            response = await AsyncClient().get(reverse('sale-export'), headers=headers)
+            self.assertTrue(response.is_async)
+            [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(logs.records[-1].timing['path'], reverse('sale-export'))
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_not_sampled(self):
+        """
+        Test that requests out of the sample are not instrumented.
+        """
+        response = self.client.get(reverse('sale-list'))
+
+        self.assertNotIn('Server-Timing', response)
+
+
+class TestSaleConditionalGet(APITestCase):
+
+    url = reverse_lazy('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00,
+        )
+        self.sale = Sale.objects.create(
+            date='2023-04-09', author=self.user, article=self.article, quantity=5, unit_selling_price=25.00
+        )
+
+    def create_sale(self, article):
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(
+                date='2023-04-10', author=self.user, article=article, quantity=1, unit_selling_price=20.00
+            )
+
+    def test_list_not_modified(self):
+        """
+        Test that polling an unchanged list answers 304 without reading the
+        sales.
+        """
+        etag = self.client.get(self.url)['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(context.captured_queries), 1)
+
+        self.create_sale(self.article)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_article_not_modified(self):
+        """
+        Test that the list of an article only changes with its own sales.
+        """
+        params = {'article_id': self.article.id}
+        etag = self.client.get(self.url, params)['ETag']
+
+        other_article = Article.objects.create(
+            code='XYZ789', category=self.article.category, name='Other Article', manufacturing_cost=5.00
+        )
+        self.create_sale(other_article)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.create_sale(self.article)
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_if_modified_since(self):
+        """
+        Test that a sale read with If-Modified-Since answers 304 until a sale
+        changes.
+        """
+        url = reverse('sale-detail', args=[self.sale.id])
+        last_modified = self.client.get(url)['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_etag(self):
+        """
+        Test that the ETag of a sale is specific to it, and that a missing sale
+        is never answered as not modified.
+        """
+        other_sale = Sale.objects.create(
+            date='2023-04-10', author=self.user, article=self.article, quantity=1, unit_selling_price=20.00
+        )
+        etag = self.client.get(reverse('sale-detail', args=[self.sale.id]))['ETag']
+
+        response = self.client.get(reverse('sale-detail', args=[other_sale.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for if_none_match in (etag, '*'):
+            response = self.client.get(reverse('sale-detail', args=[9999]), HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(find_spec('orjson'), 'orjson is not installed')
+class TestORJSONRenderer(APITestCase):
+
+    url = reverse_lazy('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Catégorie'),
+            name='Test Article',
+            manufacturing_cost=10.00,
+        )
+        Sale.objects.create(
+            date='2023-04-09', author=self.user, article=self.article, quantity=5, unit_selling_price=25.10
+        )
+
+    def test_same_document(self):
+        """
+        Test that orjson renders the same document as the stock renderer.
+        """
+        params = {'article_id': self.article.id}
+        stock = self.client.get(self.url, {**params, 'format': 'json'})
+        fast = self.client.get(self.url, {**params, 'format': 'orjson'})
+
+        self.assertEqual(fast['Content-Type'], 'application/json')
+        self.assertEqual(fast.content, stock.content)
+
+    def test_default_renderer(self):
+        """
+        Test that orjson renders the JSON responses by default.
+        """
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json')
+
+        self.assertEqual(response.accepted_renderer.format, 'orjson')
+        self.assertEqual(response.json()['results'][0]['unit_selling_price'], '25.10')
+
+
+@skipUnless(connection.vendor == 'sqlite' and settings.SQLITE_PRODUCTION, 'SQLite production profile only')
+class TestSQLiteProfile(APITestCase):
+    def open(self, path, init_command):
+        conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+        self.addCleanup(conn.close)
+        for statement in init_command.split(';'):
+            conn.execute(statement)
+        return conn
+
+    def read_while_writing(self, init_command):
+        """
+        Read a table from one connection while another one writes it, and
+        return the count read.
+        """
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'db.sqlite3')
+        writer = self.open(path, init_command)
+        writer.execute('CREATE TABLE sale (id INTEGER PRIMARY KEY)')
+        writer.execute('INSERT INTO sale DEFAULT VALUES')
+        reader = self.open(path, init_command)
+
+        writer.execute('BEGIN EXCLUSIVE')
+        writer.execute('INSERT INTO sale DEFAULT VALUES')
+        try:
+            return reader.execute('SELECT COUNT(*) FROM sale').fetchone()[0]
+        finally:
+            writer.execute('COMMIT')
+
+    def test_readers_do_not_block_on_writers(self):
+        """
+        Test that with the production pragmas a reader sees the last committed
+        data while a write is in progress, where the default journal locks it
+        out.
+        """
+        self.assertEqual(self.read_while_writing(settings.DATABASES['default']['OPTIONS']['init_command']), 1)
+
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            self.read_while_writing('PRAGMA journal_mode=delete')
+
+
+class TestSaleAsyncViews(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00,
+        )
+        self.sale = Sale.objects.create(
+            date='2023-04-09', author=self.user, article=self.article, quantity=5, unit_selling_price=25.00
+        )
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def test_async_reads(self):
+        """
+        Test that the sales are read through the ASGI request handler.
+        """
+        client = AsyncClient()
+
+        response = await client.get(reverse('sale-list'), {'article_id': self.article.id}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_of_total_selling_price'], 125.0)
+
+        response = await client.get(reverse('sale-detail', args=[self.sale.id]), headers=self.headers)
+        self.assertEqual(response.json()['article_category'], 'Category')
+
+        response = await client.get(reverse('sale-aggregate-list'), headers=self.headers)
+        self.assertEqual(response.json()['results'][0]['article_code'], 'ABC123')
+
+    async def test_async_write(self):
+        """
+        Test that the synchronous actions still run through the ASGI request
+        handler.
+        """
+        client = AsyncClient()
+
+        response = await client.delete(reverse('sale-detail', args=[self.sale.id]), headers=self.headers)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(await Sale.objects.filter(pk=self.sale.id).aexists())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The replica is a file copy of the SQLite primary')
+class TestReplicaRouting(APITransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A file copy of the primary, taken in setUp, which the test settings
+        # do not configure
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.replica_path = os.path.join(cls.directory.name, 'replica.sqlite3')
+        connections.settings[REPLICA_DB_ALIAS] = {**connection.settings_dict, 'NAME': cls.replica_path}
+        cls.databases = {*cls.databases, REPLICA_DB_ALIAS}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00,
+        )
+        Sale.objects.create(
+            date='2023-04-09', author=self.user, article=self.article, quantity=5, unit_selling_price=25.00
+        )
+
+        # The replica lags behind the primary from now on
+        connections[REPLICA_DB_ALIAS].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connection.connection.backup(replica)
+        replica.close()
+
+    def test_reads_from_replica(self):
+        """
+        Test that the safe requests read from the replica, and the writes and
+        the reads following them from the primary.
+        """
+        lagging_sale = Sale.objects.create(
+            date='2023-04-10', author=self.user, article=self.article, quantity=1, unit_selling_price=20.00
+        )
+
+        response = self.client.get(reverse('sale-detail', args=[lagging_sale.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(reverse('sale-list'), {
+            'date': '2023-04-11',
+            'author': self.user.id,
+            'article': self.article.id,
+            'quantity': 2,
+            'unit_selling_price': 30.00,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('primary_reads', response.cookies)
+
+        response = self.client.get(reverse('sale-detail', args=[lagging_sale.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.cookies.clear()
+        response = self.client.get(reverse('sale-detail', args=[lagging_sale.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_token_user_reads_own_writes(self):
+        """
+        Test that a client authenticated by a bearer token reads its writes
+        from the primary without keeping cookies, and the other users from
+        the replica.
+        """
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        response = self.client.post(reverse('sale-list'), {
+            'date': '2023-04-11',
+            'author': self.user.id,
+            'article': self.article.id,
+            'quantity': 2,
+            'unit_selling_price': 30.00,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = reverse('sale-detail', args=[response.data['id']])
+
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        other_user = User.objects.create_user(email='otheruser@example.com', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(other_user)}')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_fills_read_from_primary(self):
+        """
+        Test that the values cached or tagged under the current versions are
+        read from the primary, whatever the lag of the replica.
+        """
+        response = self.client.get(reverse('sale-list'), {'article_id': self.article.id})
+        self.assertEqual(response.data['total_of_total_selling_price'], 125.0)
+
+        response = self.client.post(reverse('sale-list'), {
+            'date': '2023-04-11',
+            'author': self.user.id,
+            'article': self.article.id,
+            'quantity': 2,
+            'unit_selling_price': 30.00,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        sale_id = response.data['id']
+        self.client.cookies.clear()
+
+        response = self.client.get(reverse('sale-list'), {'article_id': self.article.id})
+        self.assertEqual(response.data['total_of_total_selling_price'], 185.0)
+
+        response = self.client.get(reverse('sale-list'))
+        self.assertIn(f'.{sale_id}.', response['ETag'])
+
+    def test_authenticates_lagging_user(self):
+        """
+        Test that a user missing from the replica is read from the primary.
+        """
+        user = User.objects.create_user(email='newuser@example.com', password='testpass')
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        response = self.client.get(reverse('sale-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_write_pins_reads_to_primary(self):
+        """
+        Test that a write sends the following reads to the primary.
+        """
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Sale), REPLICA_DB_ALIAS)
+            Sale.objects.filter(pk=0).delete()
+            self.assertEqual(router.db_for_read(Sale), 'default')
+        self.assertEqual(router.db_for_read(Sale), 'default')
+
+
+class TestSaleArticleCode(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.article = Article.objects.create(
+            code='ABC123',
+            category=ArticleCategory.objects.create(display_name='Category'),
+            name='Test Article',
+            manufacturing_cost=10.00,
+        )
+
+    def get_sale_data(self, **kwargs):
+        return {
+            'date': '2023-04-09',
+            'author': self.user.id,
+            'quantity': 2,
+            'unit_selling_price': '25.00',
+            **kwargs,
+        }
+
+    def test_create_by_code(self):
+        """
+        Test that a sale created by article code runs the queries of a sale
+        created by article id.
+        """
+        self.client.post(reverse('sale-list'), self.get_sale_data(article_code='ABC123'))
+
+        with CaptureQueriesContext(connection) as by_id:
+            self.client.post(reverse('sale-list'), self.get_sale_data(article=self.article.id))
+        with CaptureQueriesContext(connection) as by_code:
+            response = self.client.post(reverse('sale-list'), self.get_sale_data(article_code='ABC123'))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['article'], self.article.id)
+        self.assertNotIn('article_code', response.data)
+        self.assertEqual(len(by_code), len(by_id))
+        self.assertEqual(Sale.objects.filter(article=self.article).count(), 3)
+
+    def test_bulk_create_by_code(self):
+        """
+        Test that a batch created by article codes runs the queries of a batch
+        created by article ids.
+        """
+        url = reverse('sale-bulk')
+        self.client.post(url, data=[self.get_sale_data(article_code='ABC123')])
+
+        with CaptureQueriesContext(connection) as by_id:
+            self.client.post(url, data=[self.get_sale_data(article=self.article.id) for _ in range(10)])
+        with CaptureQueriesContext(connection) as by_code:
+            response = self.client.post(url, data=[
+                *(self.get_sale_data(article_code='ABC123') for _ in range(9)),
+                self.get_sale_data(article_code='XYZ789'),
+            ])
+
+        self.assertEqual(len(response.data['created']), 9)
+        self.assertEqual(response.data['errors'][0]['index'], 9)
+        self.assertIn('article_code', response.data['errors'][0]['errors'])
+        self.assertEqual(len(by_code), len(by_id))
+
+    def test_invalid_code(self):
+        """
+        Test that unknown codes and payloads giving both an article and its
+        code are rejected.
+        """
+        for data in (
+            self.get_sale_data(article_code='XYZ789'),
+            self.get_sale_data(article_code='ABC123', article=self.article.id),
+            self.get_sale_data(),
+        ):
+            response = self.client.post(reverse('sale-list'), data)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Sale.objects.count(), 0)
+
+    def test_code_change(self):
+        """
+        Test that saving or deleting an article reloads the codes.
+        """
+        self.client.post(reverse('sale-list'), self.get_sale_data(article_code='ABC123'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.code = 'XYZ789'
+            self.article.save()
+
+        response = self.client.post(reverse('sale-list'), self.get_sale_data(article_code='ABC123'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('sale-list'), self.get_sale_data(article_code='XYZ789'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.all().delete()
+            self.article.delete()
+
+        response = self.client.post(reverse('sale-list'), self.get_sale_data(article_code='XYZ789'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+    def test_code_map_timeout(self):
+        """
+        Test that the codes are reloaded after their timeout, even when the
+        version of the articles did not change.
+        """
+        with override_settings(ARTICLE_CODES_TIMEOUT=0):
+            self.client.post(reverse('sale-list'), self.get_sale_data(article_code='ABC123'))
+        Article.objects.filter(pk=self.article.pk).update(code='XYZ789')
+        response = self.client.post(reverse('sale-list'), self.get_sale_data(article_code='XYZ789'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        Article.objects.filter(pk=self.article.pk).update(code='ABC123')
+        response = self.client.post(reverse('sale-list'), self.get_sale_data(article_code='ABC123'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_process_local_cache_check(self):
+        """
+        Test that a cache local to the process is reported outside of debug
+        and tests.
+        """
+        local_caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local_caches, DEBUG=False, TEST=False):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['sales.W001'])
+        with override_settings(CACHES=local_caches, DEBUG=True, TEST=False):
+            self.assertEqual(check_shared_cache(None), [])
+        # The tests run on a cache of their own
+        self.assertEqual(check_shared_cache(None), [])
+
+
+class TestSaleReport(APITestCase):
+
+    url = reverse_lazy('sale-report-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.other_user = User.objects.create_user(email='otheruser@example.com', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+        self.category = ArticleCategory.objects.create(display_name='Category')
+        self.other_category = ArticleCategory.objects.create(display_name='Other Category')
+        self.articles = [
+            Article.objects.create(
+                code=f'ART00{index}', category=category, name=f'Article {index}', manufacturing_cost=cost,
+            )
+            for index, (category, cost) in enumerate([
+                (self.category, 10), (self.category, 5), (self.other_category, 20), (self.other_category, 1),
+            ])
+        ]
+        for article, author, day, quantity, price in [
+            (self.articles[0], self.user, '2023-01-10', 2, 25),
+            (self.articles[0], self.other_user, '2023-02-10', 1, 25),
+            (self.articles[1], self.user, '2023-01-20', 4, 10),
+            (self.articles[2], self.user, '2023-02-05', 1, 40),
+            (self.articles[2], self.other_user, '2023-02-06', 3, 40),
+            (self.articles[3], self.user, '2023-03-01', 10, 2),
+        ]:
+            Sale.objects.create(
+                date=day, author=author, article=article, quantity=quantity, unit_selling_price=price
+            )
+
+    def test_report(self):
+        """
+        Test that the measures are computed per group of dimension values.
+        """
+        response = self.client.get(self.url, {
+            'dimensions': 'category,month',
+            'measures': 'revenue,cost,margin_percentage,total_quantity,sale_count,last_date',
+            'ordering': 'month',
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(response.data['results'][:2], [
+            {
+                'category_id': self.category.id,
+                'category_name': 'Category',
+                'month': '2023-01-01',
+                'revenue': '90.00',
+                'cost': '40.00',
+                'margin_percentage': 55.56,
+                'total_quantity': 6,
+                'sale_count': 2,
+                'last_date': '2023-01-20',
+            },
+            {
+                'category_id': self.category.id,
+                'category_name': 'Category',
+                'month': '2023-02-01',
+                'revenue': '25.00',
+                'cost': '10.00',
+                'margin_percentage': 60.0,
+                'total_quantity': 1,
+                'sale_count': 1,
+                'last_date': '2023-02-10',
+            },
+        ])
+        self.assertEqual(
+            [(row['category_name'], row['month']) for row in response.data['results'][2:]],
+            [('Other Category', '2023-02-01'), ('Other Category', '2023-03-01')],
+        )
+
+    def test_single_query(self):
+        """
+        Test that a report runs a single GROUP BY query.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'dimensions': 'article,author,year', 'limit': 2})
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('GROUP BY', context.captured_queries[0]['sql'])
+
+    def test_filters(self):
+        """
+        Test that the filters of the sales list restrict the grouped sales.
+        """
+        response = self.client.get(self.url, {
+            'dimensions': 'author', 'category': self.other_category.id, 'date_after': '2023-02-06',
+        })
+
+        self.assertEqual(response.data['results'], [
+            {'author_id': self.other_user.id, 'revenue': '120.00', 'sale_count': 1},
+            {'author_id': self.user.id, 'revenue': '20.00', 'sale_count': 1},
+        ])
+
+    def test_keyset_pagination(self):
+        """
+        Test that the cursor walks through the top groups without gaps nor
+        duplicates, including ties.
+        """
+        Sale.objects.create(
+            date='2023-03-02', author=self.other_user, article=self.articles[1], quantity=2, unit_selling_price=10
+        )
+        for ordering in ('-revenue', 'margin_percentage', '-sale_count', 'month'):
+            params = {'dimensions': 'article,month', 'measures': 'revenue,margin_percentage,sale_count'}
+            expected = self.client.get(self.url, {**params, 'ordering': ordering}).data['results']
+
+            rows, url, data = [], self.url, {**params, 'ordering': ordering, 'limit': 2}
+            while url:
+                response = self.client.get(url, data)
+                self.assertLessEqual(len(response.data['results']), 2)
+                rows += response.data['results']
+                url, data = response.data['next'], None
+
+            self.assertEqual(len(expected), 6)
+            self.assertEqual(rows, expected, ordering)
+
+        self.assertEqual(
+            [row['article_code'] for row in expected][:2], ['ART000', 'ART001'],
+        )
+
+    def test_invalid_query(self):
+        """
+        Test that only the whitelisted dimensions, measures and orderings are
+        accepted.
+        """
+        for params in (
+            {},
+            {'dimensions': 'article__name'},
+            {'dimensions': 'article', 'measures': 'unit_selling_price'},
+            {'dimensions': 'article', 'ordering': '-cost'},
+            {'dimensions': 'article', 'limit': 0},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+        for dimensions, values in (
+            ('article', 'invalid'),
+            ('day', [1, 2]),
+            ('day', ['not-a-date', '2023-01-01']),
+            ('article', [{}, 1]),
+        ):
+            cursor = values if isinstance(values, str) else urlsafe_b64encode(json.dumps(values).encode()).decode()
+            response = self.client.get(self.url, {'dimensions': dimensions, 'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, values)
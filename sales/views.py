@@ -1,14 +1,37 @@
 from collections import OrderedDict
-from django.db.models import F, FloatField, Sum
-from rest_framework.viewsets import ModelViewSet
-from rest_framework.filters import OrderingFilter
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.db.models import DateField, F, Max, Sum
+from django.db.models.functions import Coalesce, Trunc
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.viewsets import GenericViewSet, ModelViewSet, ViewSet
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
-from sales.models import Article, Sale
-from sales.serializers import ArticleSerializer, SaleSerializer
+from rest_framework.utils.urls import replace_query_param
+from sales.cache import ArticleCache, aget_sales_version, article_aggregates_cache
+from sales.exports import EXPORT_FORMATS, astream, stream
+from sales.fields import as_money
+from sales.filters import SaleFilter, SaleOrderingFilter
+from sales.mixins import AsyncViewSetMixin
+from sales.models import Article, ArticleSalesSummary, Sale, SalesDaily
+from sales.pagination import SaleKeysetPagination, SalePageNumberPagination
+from sales.reports import InvalidCursor, SaleReport
+from sales.rollups import apply_sale_changes, sale_state
+from sales.serializers import (
+    ArticleSerializer, SaleAggregateSerializer, SaleReportQuerySerializer, SaleReportRowSerializer, SaleRowSerializer,
+    SaleSerializer, SaleTimeSeriesQuerySerializer, SaleTimeSeriesSerializer,
+)
 from .permissions import CreateOnly, IsOwnerOrReadOnly
  
 class ArticleViewset(ModelViewSet):
@@ -24,55 +47,155 @@ class ArticleViewset(ModelViewSet):
         return Article.objects.all()
 
 
-class SaleViewset(ModelViewSet):
+class SaleViewset(AsyncViewSetMixin, ModelViewSet):
     """
     Viewset for the Sale model
     """
     
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
     serializer_class = SaleSerializer
-    filter_backends = [OrderingFilter]
-    pagination_class = PageNumberPagination
+    filter_backends = [DjangoFilterBackend, SaleOrderingFilter]
+    filterset_class = SaleFilter
+    # Every ordering is backed by an index, with the id as tie-breaker
+    ordering_fields = SaleKeysetPagination.ordering_fields
+    pagination_class = SalePageNumberPagination
+    keyset_pagination_class = SaleKeysetPagination
+    bulk_max_size = 1000
+    bulk_batch_size = 500
+    export_chunk_size = 2000
 
-    def get_queryset(self):
-        queryset = Sale.objects.all()
+    @property
+    def paginator(self):
+        """
+        Page on a keyset instead of page numbers when a `cursor` is given.
+        """
+        if not hasattr(self, '_paginator'):
+            if self.keyset_pagination_class.cursor_query_param in self.request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
+    def get_article_id(self):
+        """
+        Return the article the list is restricted to, if any.
+        """
         article_id = self.request.GET.get('article_id')
+        if article_id is None:
+            return None
+        try:
+            return int(article_id)
+        except ValueError:
+            raise ValidationError({'article_id': 'A valid integer is required.'})
+
+    def get_queryset(self):
+        queryset = Sale.objects.select_related('article__category').order_by('-date', '-id')
+
+        article_id = self.get_article_id()
         if article_id is not None:
             # Filter by article_id
             queryset = queryset.filter(article_id=article_id)
 
-            self.last_selling_date = queryset.order_by('-date').first().date
-
-            # Sort the results in descending order by the total_selling_price 
+            # Sort the results in descending order by the total_selling_price
             queryset = queryset.annotate(
-                total_selling_price=Sum(F('quantity') * F('unit_selling_price'), output_field=FloatField())
-            ).order_by('-total_selling_price')
+                total_selling_price=as_money(F('quantity') * F('unit_selling_price'))
+            ).order_by('-total_selling_price', '-id')
 
+        return queryset
 
-            # Get the total of total_selling_price
-            total_of_total_selling_price = queryset.aggregate(
-                total_selling_price=Sum(F('quantity') * F('unit_selling_price'), output_field=FloatField())
-            )
-            
-            # Set the value as an attribute
-            self.total_of_total_selling_price = total_of_total_selling_price['total_selling_price']
+    def get_maintained_count(self, filter_params):
+        """
+        Return the number of sales matching the filters from the maintained
+        summaries when the filters allow it, None otherwise.
+        """
+        if not filter_params:
+            return ArticleSalesSummary.objects.aggregate(count=Coalesce(Sum('sale_count'), 0))['count']
+        if filter_params.keys() in ({'article_id'}, {'article'}):
+            try:
+                article_id = int(next(iter(filter_params.values()))[-1])
+            except ValueError:
+                # e.g. an empty or decimal `article`, which the filters accept:
+                # count the rows they match
+                return None
+            summaries = ArticleSalesSummary.objects.filter(article_id=article_id)
+            return summaries.values_list('sale_count', flat=True).first() or 0
+        return None
 
-            # Calculate the profit
-            total_of_total_cost_price = queryset.annotate(
-                total_cost_price=F('quantity') * F('article__manufacturing_cost')
-            )
+    async def aget_validators(self):
+        """
+        Return the ETag and last modification time of the sales read by the
+        request, from maintained high-water marks rather than from the sales.
+
+        The ETag is built from the version of the article for a list restricted
+        to one, from the sale id and the version of the sales for a sale, and
+        from the highest sale id and the version of the sales otherwise. The
+        versions are bumped on every sale write.
 
-            total_of_total_cost_price = total_of_total_cost_price.aggregate(total_cost_price=Sum(F('total_cost_price'), output_field=FloatField()))
+        The sales are read from the primary: a lagging replica would pair stale
+        rows with the current versions.
+        """
+        article_id = self.get_article_id()
+        sales_version = await aget_sales_version()
+        if article_id is not None and self.action == 'list':
+            tag = f'a{article_id}.{await ArticleCache.aget_version(article_id)}'
+        elif self.action == 'retrieve':
+            # A missing sale is never "not modified"
+            try:
+                pk = Sale._meta.pk.to_python(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+            except DjangoValidationError:
+                raise NotFound()
+            if not await Sale.objects.using(DEFAULT_DB_ALIAS).filter(pk=pk).aexists():
+                raise NotFound()
+            tag = f's{pk}.{sales_version}'
+        else:
+            max_id = (await Sale.objects.using(DEFAULT_DB_ALIAS).aaggregate(max_id=Max('pk')))['max_id']
+            tag = f'{max_id}.{sales_version}'
+        etag = quote_etag(f'{self.request.accepted_renderer.format}.{tag}')
+        return etag, sales_version // 10**9
 
-            total_of_total_cost_price = total_of_total_cost_price['total_cost_price']
+    async def aget_not_modified_response(self):
+        """
+        Return a 304 response when the client's copy is still current, before
+        any query on the sales.
+        """
+        self.etag, self.last_modified = await self.aget_validators()
+        return get_conditional_response(self.request, etag=self.etag, last_modified=self.last_modified)
 
-            self.profit = self.total_of_total_selling_price - total_of_total_cost_price
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.etag
+            response['Last-Modified'] = http_date(self.last_modified)
+        return response
 
-            # Get the last selling date
-            self.last_selling_date = queryset.order_by('-date').first().date
+    async def aget_article_aggregates(self, article_id):
+        """
+        Return the totals of an article, cached until one of its sales changes.
+        """
+        aggregates = await article_aggregates_cache.aget(article_id)
+        if aggregates is None:
+            aggregates = await self.acompute_article_aggregates(article_id)
+            await article_aggregates_cache.aset(article_id, aggregates)
+        return aggregates
 
-        return self.filter_queryset(queryset)
+    async def acompute_article_aggregates(self, article_id):
+        """
+        Read the totals of an article from its maintained sales summary, on the
+        primary: they are cached under the current version of the article.
+        """
+        summaries = ArticleSalesSummary.objects.using(DEFAULT_DB_ALIAS)
+        summary = await summaries.filter(article_id=article_id).afirst()
+        if summary is None:
+            return OrderedDict([
+                ('total_of_total_selling_price', 0.0),
+                ('profit', 0.0),
+                ('last_selling_date', None),
+            ])
+        return OrderedDict([
+            ('total_of_total_selling_price', float(summary.total_revenue)),
+            ('profit', float(summary.profit)),
+            ('last_selling_date', summary.last_sale_date),
+        ])
 
     def perform_create(self, serializer):
         """
@@ -83,30 +206,287 @@ class SaleViewset(ModelViewSet):
             author = self.request.user
         serializer.save(author=author)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        page = self.paginate_queryset(queryset)
+    def get_owned_sales(self):
+        """
+        Return the sale of the URL as a queryset, restricted to the sales of the
+        current user: writes through it are conditional on the ownership.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            pk = Sale._meta.pk.to_python(self.kwargs[lookup_url_kwarg])
+        except DjangoValidationError:
+            raise NotFound()
+        self.sale_pk = pk
+        return Sale.objects.filter(pk=pk, author_id=self.request.user.id)
+
+    def raise_not_owned(self):
+        """
+        Explain a write that matched no sale: it is either someone else's or
+        missing. Only run on failure.
+        """
+        if Sale.objects.filter(pk=self.sale_pk).exists():
+            raise PermissionDenied()
+        raise NotFound()
+
+    def update(self, request, *args, **kwargs):
+        """
+        Update a sale of the current user with one `UPDATE ... WHERE id = ? AND
+        author_id = ?`, after locking and reading the row the rollups and the
+        response need.
+
+        The ownership is checked before the payload, so that someone else's sale
+        answers 403 whatever the payload.
+        """
+        partial = kwargs.pop('partial', False)
+
+        with transaction.atomic():
+            sales = self.get_owned_sales()
+            sale = sales.select_related('article__category').select_for_update(of=('self',)).first()
+            if sale is None:
+                self.raise_not_owned()
+            serializer = self.get_serializer(data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            if not serializer.validated_data:
+                # Nothing to write, e.g. a payload of read-only fields
+                return Response(self.get_serializer(sale).data)
+            previous = sale_state(sale)
+
+            if not sales.update(**serializer.validated_data):
+                self.raise_not_owned()
+            for attr, value in serializer.validated_data.items():
+                setattr(sale, attr, value)
+            # update() bypasses the signals maintaining the rollups
+            apply_sale_changes(removed=[previous], added=[sale_state(sale)])
+
+        return Response(self.get_serializer(sale).data)
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Delete a sale of the current user, after locking and reading the row.
+
+        The locked row is deleted through the deletion collector, so that the
+        cascades and the receivers maintaining the rollups run.
+        """
+        with transaction.atomic():
+            sale = self.get_owned_sales().select_for_update().first()
+            if sale is None:
+                self.raise_not_owned()
+            sale.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create a batch of sales in one transaction.
+
+        The related authors and articles of the whole batch are fetched with one
+        query per model, and the valid sales are inserted with bulk_create().
+        Invalid items are reported by index without rejecting the others.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Expected a list of sales.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_size:
+            return Response(
+                {'detail': f'A batch cannot contain more than {self.bulk_max_size} sales.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        context = self.get_serializer_context()
+        payloads = [item for item in items if isinstance(item, dict)]
+        context['article_ids_by_code'] = SaleSerializer.get_article_ids_by_code(payloads)
+        context['related_instances'] = SaleSerializer.get_related_instances(payloads, context['article_ids_by_code'])
+
+        sales, indexes, errors = [], [], []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item, context=context)
+            if serializer.is_valid():
+                sales.append(Sale(**serializer.validated_data))
+                indexes.append(index)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        with transaction.atomic():
+            sales = Sale.objects.bulk_create(sales, batch_size=self.bulk_batch_size)
+            # bulk_create() bypasses the signals maintaining the rollups
+            apply_sale_changes(added=[sale_state(sale) for sale in sales])
+
+        data = OrderedDict([
+            ('created', [{'index': index, 'id': sale.pk} for index, sale in zip(indexes, sales)]),
+            ('errors', errors),
+        ])
+        return Response(data, status=status.HTTP_201_CREATED if sales else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every sale matching the list filters as CSV or NDJSON.
+
+        The rows are read in chunks with iterator(), or aiterator() under ASGI,
+        so memory stays flat whatever the number of sales.
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'detail': f'Unknown export format, expected one of: {", ".join(EXPORT_FORMATS)}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        content_type, lines_class = EXPORT_FORMATS[export_format]
+        lines = lines_class(SaleRowSerializer.fields)
+
+        queryset = SaleRowSerializer.values(self.filter_queryset(self.get_queryset()))
+        if isinstance(request._request, ASGIRequest):
+            # Django would read a synchronous iterator whole under ASGI
+            serializer = SaleRowSerializer(queryset.aiterator(chunk_size=self.export_chunk_size))
+            content = astream(lines, serializer.aiter_representations())
+        else:
+            serializer = SaleRowSerializer(queryset.iterator(chunk_size=self.export_chunk_size))
+            content = stream(lines, serializer.iter_representations())
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="sales.{export_format}"'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Hit and miss counters of the article aggregates cache, for this process.
+        """
+        return Response(article_aggregates_cache.get_stats())
+
+    async def retrieve(self, request, *args, **kwargs):
+        not_modified = await self.aget_not_modified_response()
+        if not_modified is not None:
+            return not_modified
+
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+    async def list(self, request, *args, **kwargs):
+        not_modified = await self.aget_not_modified_response()
+        if not_modified is not None:
+            return not_modified
+
+        # Read-only fast path: plain rows instead of model instances
+        queryset = SaleRowSerializer.values(self.filter_queryset(self.get_queryset()))
+        # The paginators are synchronous
+        page = await sync_to_async(self.paginate_queryset)(queryset)
 
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            data = OrderedDict([
-                ('count', self.paginator.page.paginator.count),
-                ('next', self.paginator.page.next_page_number() if self.paginator.page.has_next() else None),
-                ('previous', self.paginator.page.previous_page_number() if self.paginator.page.has_previous() else None),
-            ])
+            serializer = SaleRowSerializer(page)
+            data = self.paginator.get_page_metadata()
         else:
-            serializer = self.get_serializer(queryset, many=True)
+            serializer = SaleRowSerializer([row async for row in queryset])
             data = OrderedDict([
-                ('count', queryset.count()),
+                ('count', len(serializer.rows)),
                 ('next', None),
                 ('previous', None),
             ])
 
-        if 'article_id' in self.request.GET:
-            data['total_of_total_selling_price'] = self.total_of_total_selling_price
-            data['profit'] = self.profit
-            data['last_selling_date'] = self.last_selling_date
+        article_id = self.get_article_id()
+        if article_id is not None:
+            data.update(await self.aget_article_aggregates(article_id))
 
         data['results'] = serializer.data
 
-        return Response(data)
\ No newline at end of file
+        return Response(data)
+
+
+class SaleAggregateViewset(AsyncViewSetMixin, GenericViewSet):
+    """
+    Read-only viewset of the sales aggregated by article
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = SaleAggregateSerializer
+    filter_backends = []
+    pagination_class = PageNumberPagination
+
+    def get_queryset(self):
+        # A single GROUP BY over the sales joined to their article and category
+        return Sale.objects.values(
+            'article_id',
+            article_code=F('article__code'),
+            article_name=F('article__name'),
+            article_category=F('article__category__display_name'),
+        ).annotate(
+            total_selling_price=Sum(as_money(F('quantity') * F('unit_selling_price'))),
+            total_cost=Sum(as_money(F('quantity') * F('article__manufacturing_cost'))),
+            last_selling_date=Max('date'),
+        ).order_by('-total_selling_price', 'article_id')
+
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # The paginators are synchronous
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([row async for row in queryset], many=True).data)
+
+
+class SaleTimeSeriesViewset(ViewSet):
+    """
+    Read-only viewset of the sales totals bucketed by period
+
+    Reads the daily rollups: a yearly chart aggregates about 365 rows per
+    article instead of every sale.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        query = SaleTimeSeriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        queryset = SalesDaily.objects.filter(date__range=(params['start'], params['end']))
+        if 'article' in params:
+            queryset = queryset.filter(article_id=params['article'])
+        if 'category' in params:
+            queryset = queryset.filter(article__category_id=params['category'])
+
+        rows = queryset.annotate(
+            period=Trunc('date', params['bucket'], output_field=DateField()),
+        ).values('period').annotate(
+            revenue=Sum('total_revenue'),
+            cost=Sum('total_cost'),
+            quantity=Sum('quantity'),
+            sale_count=Sum('sale_count'),
+        ).order_by('period')
+
+        return Response(SaleTimeSeriesSerializer(rows, many=True).data)
+
+
+class SaleReportViewset(ViewSet):
+    """
+    Read-only viewset of the sales grouped by the dimensions and aggregated
+    into the measures chosen by the client, e.g.
+    `?dimensions=category,month&measures=revenue,margin_percentage&ordering=-revenue&limit=10`
+
+    The sales can be restricted with the filters of the sales list. The groups
+    are paged through with the `next` cursor link.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        query = SaleReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        filterset = SaleFilter(request.query_params, queryset=Sale.objects.all(), request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        report = SaleReport(params['dimensions'], params['measures'], params.get('ordering'))
+        try:
+            rows, cursor = report.get_page(filterset.qs, params['limit'], params.get('cursor'))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+
+        next_link = None
+        if cursor is not None:
+            next_link = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('results', SaleReportRowSerializer(rows, report.output_columns).data),
+        ]))
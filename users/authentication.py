@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class LocalUserCache:
+    """
+    Least recently used cache of users, local to the process, whose entries
+    expire after a few seconds.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self.lock:
+            self.entries[user_id] = (user, time.monotonic() + self.timeout)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_user_cache = LocalUserCache(
+    max_size=settings.AUTH_USER_LOCAL_CACHE_SIZE, timeout=settings.AUTH_USER_LOCAL_CACHE_TIMEOUT
+)
+
+
+def get_user_cache_key(user_id):
+    return f"users:auth:{user_id}"
+
+
+def invalidate_user(user_id):
+    """
+    Drop a user from the caches of the authenticated users.
+
+    Other processes only drop their local copy when it expires, hence its
+    short timeout.
+    """
+    local_user_cache.delete(str(user_id))
+    cache.delete(get_user_cache_key(user_id))
+
+
+# Fields of the users kept in the caches: never the password hash
+CACHED_USER_FIELDS = ("id", "is_active", "is_staff", "is_superuser")
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication reading the token's user from a local then a shared
+    cache before the database.
+
+    The caches keep the `CACHED_USER_FIELDS` of the users and the hash
+    revoking their tokens, from which each request gets its own user: the
+    other fields are loaded from the database on access. Saving or deleting a
+    user invalidates its entries (see `users.signals`), which covers
+    `is_active` and password changes.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        entry = self.get_cached_user(user_id)
+        fields = self.user_model._meta.concrete_fields
+        values = [entry["fields"].get(field.attname, DEFERRED) for field in fields]
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, [field.attname for field in fields], values)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry["revoke_hash"]:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+    def get_cached_user(self, user_id):
+        """
+        Return the cache entry of a user: its `CACHED_USER_FIELDS` and the
+        hash of its password that its tokens carry.
+        """
+        local_key = str(user_id)
+        entry = local_user_cache.get(local_key)
+        if entry is not None:
+            return entry
+
+        key = get_user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            try:
+                # From the primary: the cache would keep a stale user past the
+                # replica lag
+                users = self.user_model.objects.using(DEFAULT_DB_ALIAS)
+                fields = users.values(*CACHED_USER_FIELDS, "password").get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            entry = {"revoke_hash": get_md5_hash_password(fields.pop("password")), "fields": fields}
+            cache.set(key, entry, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+
+        local_user_cache.set(local_key, entry)
+        return entry
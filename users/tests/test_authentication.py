@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import CachedJWTAuthentication, get_user_cache_key, local_user_cache
+from users.models import User
+
+
+class TestCachedJWTAuthentication(APITestCase):
+
+    url = reverse('sale-list')
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='testuser@example.com', password='testpass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def get_user_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query for query in context.captured_queries if 'users_user' in query['sql']]
+
+    def test_cached_user(self):
+        """
+        Test that the user is only read from the database on the first request.
+        """
+        self.assertEqual(len(self.get_user_queries()), 1)
+        self.assertEqual(self.get_user_queries(), [])
+
+    def test_shared_cache(self):
+        """
+        Test that a process without a local copy reads the shared cache.
+        """
+        self.get_user_queries()
+        local_user_cache.clear()
+
+        self.assertEqual(self.get_user_queries(), [])
+
+    def test_cached_fields(self):
+        """
+        Test that the caches keep no password hash, and that the other fields
+        of the user are loaded on access.
+        """
+        self.get_user_queries()
+
+        entry = cache.get(get_user_cache_key(self.user.id))
+        self.assertNotIn('password', entry['fields'])
+        self.assertNotIn(self.user.password, str(entry))
+        user = CachedJWTAuthentication().get_user(AccessToken.for_user(self.user))
+        self.assertEqual((user.pk, user.is_active, user.is_staff), (self.user.pk, True, False))
+        self.assertEqual(user.email, 'testuser@example.com')
+
+    def test_inactive_user(self):
+        """
+        Test that deactivating a user invalidates its cached copies.
+        """
+        self.get_user_queries()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user(self):
+        """
+        Test that deleting a user invalidates its cached copies.
+        """
+        self.get_user_queries()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change(self):
+        """
+        Test that changing the password invalidates the cached copies.
+        """
+        self.get_user_queries()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('newpass')
+            self.user.save()
+
+        self.assertEqual(len(self.get_user_queries()), 1)